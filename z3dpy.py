@@ -101,7 +101,28 @@ from random import random as rand
 from struct import unpack
 
 # Math for, well...
-from math import sqrt, floor, ceil, sin, cos, tan
+from math import sqrt, floor, ceil, sin, cos, tan, inf
+
+# Array for the flat storage in MeshBuffers
+from array import array
+
+# Multiprocessing for the TileRasterizer
+from multiprocessing import Pool, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.util import Finalize
+
+# Itemgetter for putting sorted tris in order
+from operator import itemgetter
+
+# Hashing and JSON for the baked lighting cache
+from hashlib import sha1
+from json import dumps, loads
+
+# NumPy is optional, MeshBuffers will use it if it's installed.
+try:
+    import numpy as np
+except:
+    np = None
 
 # z3dpyfast is imported at the bottom of the script to replace functions.
 
@@ -136,6 +157,50 @@ worldColour = (0.0, 0.0, 0.0)
 
 airDrag = 0.02
 
+# Physics bodies that barely move for sleepTime seconds are put to sleep,
+# and skipped by HandlePhysics() and PhysicsCollisions() till something hits
+# them, or their position, rotation, velocity or acceleration is changed.
+# sleepVelocity is in units per second.
+physicsSleeping = True
+sleepVelocity = 0.1
+sleepTime = 1.0
+
+# When True, RenderThings() and RenderMeshList() multiply each mesh by one
+# combined model-view matrix, and project in the same pass.
+fusedPipeline = False
+
+# When True, meshes that have bounds (see Mesh.UpdateBounds()) are skipped
+# entirely if they are outside the camera's view.
+frustumCulling = True
+
+# Draw distance for each layer, used instead of each Thing's drawDistance.
+# For example, {0: 200} draws the background layer further out.
+layerDrawDistances = {}
+
+# How many frames RenderThings() and RenderMeshList() can reuse the last
+# sorted order for, as long as the number of tris is the same. Good for
+# scenes that barely move, 0 sorts every frame.
+# sortCache keeps the orders of the last sortCacheSize lists.
+sortReuseFrames = 0
+sortCacheSize = 8
+sortCache = {}
+
+# Set by PhysicsScheduler.Update(), where each thing was before the last
+# physics step, and how far the frame is between that step and the next.
+# RenderThings() draws movable things blended between the two.
+interpPrevious = {}
+interpAlpha = 1.0
+
+# When True, and there are at least lightGridMinimum lights, RenderThings(),
+# RenderMeshList() and BakeLighting() sort the lights into a LightGrid, so
+# CheapLighting() only looks at the lights that can reach each tri.
+# lightGrid is only set while they're running, the grid is kept in
+# lightGridCache between frames.
+lightCulling = True
+lightGridMinimum = 4
+lightGrid = None
+lightGridCache = None
+
 # Internal list of lights
 lights = []
 
@@ -207,6 +272,283 @@ def Tri(vector1, vector2, vector3):
         vector3 = vector3 + [[0, 0, 0], [0, 0]]
     return [vector1, vector2, vector3, (0.0, 0.0, 0.0), (255, 255, 255), 0, 0]
 
+# Mesh Buffers:
+#
+# An alternative to a list of tris for big meshes, everything
+# is stored in flat typed arrays (NumPy arrays if it's installed)
+# instead of millions of little lists.
+#
+# Points are only stored once, and tris refer to them by index, so
+# a point shared by six tris is only transformed once when rendering.
+#
+# Per point, the arrays hold:
+# points - 3 floats, x y and z
+# normals - 3 floats
+# uvs - 2 floats, u and v
+#
+# Per tri, the arrays hold:
+# indices - 3 ints, the index of each point
+# shades - 3 floats, the baked shade
+# colours - 3 floats
+# ids - 1 int
+# users - the user variable, in a regular list
+#
+# After BakeLighting(perVertex=True), pointShades holds 3 floats per point,
+# the shade of each point, and tris give the shades of their 3 points.
+# It's None otherwise. Setting a single shade on a tri goes back to one
+# shade per tri for the whole buffer.
+#
+# Looping through or indexing a MeshBuffer gives BufferTris, which act
+# like regular tris (writing to them goes back into the buffer)
+# so existing code keeps working.
+#
+# The points of a BufferTri are copies. Setting one changes the
+# point for every tri that shares it.
+#
+# If you change the arrays directly, call ClearCache() afterwards.
+
+def BufferArray(values, typecode='d'):
+    if np is not None:
+        return np.array(values, dtype=np.float64 if typecode == 'd' else np.int64)
+    return array(typecode, values)
+
+# MeshBuffer(tris) will find the points that are shared between tris.
+# If you've already got a list of VectorUVs and the indices of each tri, use
+# MeshBuffer(verts=myVectorUVs, faces=[[0, 1, 2], [0, 2, 3], ...])
+class MeshBuffer():
+    def __init__(self, tris=(), verts=(), faces=()):
+        points = []
+        normals = []
+        uvs = []
+        indices = []
+        shades = []
+        colours = []
+        ids = []
+        self.users = []
+        if faces:
+            for v in verts:
+                points += v[:3]
+                if len(v) == 5:
+                    normals += v[3]
+                    uvs += v[4]
+                else:
+                    normals += (0.0, 0.0, 0.0)
+                    uvs += (0.0, 0.0)
+            for f in faces:
+                indices += f[:3]
+            count = len(faces)
+            shades = [0.0] * (count * 3)
+            colours = [255.0] * (count * 3)
+            ids = [0] * count
+            self.users = [0] * count
+        else:
+            found = {}
+            pointShades = {}
+            for tri in tris:
+                for p in tri[:3]:
+                    if len(p) == 5:
+                        key = (p[0], p[1], p[2], p[3][0], p[3][1], p[3][2], p[4][0], p[4][1])
+                    else:
+                        key = (p[0], p[1], p[2], 0.0, 0.0, 0.0, 0.0, 0.0)
+                    if key not in found:
+                        found[key] = len(found)
+                        points += key[:3]
+                        normals += key[3:6]
+                        uvs += key[6:]
+                    indices.append(found[key])
+                if TriHasPointShades(tri):
+                    for i, shade in zip(indices[-3:], tri[3]):
+                        pointShades[i] = shade
+                    shades += VectorDivF(VectorAdd(VectorAdd(tri[3][0], tri[3][1]), tri[3][2]), 3)
+                else:
+                    shades += tri[3]
+                colours += tri[4]
+                ids.append(tri[5])
+                self.users.append(tri[6])
+        self.points = BufferArray(points)
+        self.normals = BufferArray(normals)
+        self.uvs = BufferArray(uvs)
+        self.indices = BufferArray(indices, 'q')
+        self.shades = BufferArray(shades)
+        self.colours = BufferArray(colours)
+        self.ids = BufferArray(ids, 'q')
+        self.pointShades = None
+        if not faces and pointShades:
+            self.pointShades = BufferArray([0.0] * len(points))
+            for i, shade in pointShades.items():
+                self.pointShades[i * 3:i * 3 + 3] = BufferArray(shade)
+        self.cache = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return [BufferTri(self, i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not -1 < index < len(self):
+            raise IndexError("MeshBuffer index out of range")
+        return BufferTri(self, index)
+
+    def __iter__(self):
+        return (BufferTri(self, i) for i in range(len(self)))
+
+    def GetPointCount(self):
+        return len(self.points) // 3
+
+    # Returns a point as a VectorUV
+    def GetVert(self, vert):
+        return self.points[vert * 3:vert * 3 + 3].tolist() + [self.normals[vert * 3:vert * 3 + 3].tolist(), self.uvs[vert * 2:vert * 2 + 2].tolist()]
+
+    def GetPoint(self, index, point):
+        return self.GetVert(int(self.indices[index * 3 + point]))
+
+    def GetItem(self, index, item):
+        match item:
+            case 0 | 1 | 2:
+                return self.GetPoint(index, item)
+            case 3:
+                if self.pointShades is not None:
+                    return tuple(self.GetPointShade(int(self.indices[index * 3 + p])) for p in range(3))
+                return tuple(self.shades[index * 3:index * 3 + 3].tolist())
+            case 4:
+                return tuple(self.colours[index * 3:index * 3 + 3].tolist())
+            case 5:
+                return int(self.ids[index])
+            case 6:
+                return self.users[index]
+        raise IndexError("Tri index out of range")
+
+    def GetPointShade(self, vert):
+        return tuple(self.pointShades[vert * 3:vert * 3 + 3].tolist())
+
+    # The normals, UVs, shade, id, and user of each tri, in a tuple.
+    # The batch functions reuse these instead of building new lists every frame.
+    def GetAttributes(self):
+        if self.cache is None:
+            normals = self.normals.tolist()
+            uvs = self.uvs.tolist()
+            shades = self.shades.tolist()
+            ids = self.ids.tolist()
+            indices = self.indices.tolist()
+            # Shared points share their normal and UV lists, like LoadMesh() does
+            n = [normals[v:v + 3] for v in range(0, len(normals), 3)]
+            u = [uvs[v:v + 2] for v in range(0, len(uvs), 2)]
+            if self.pointShades is not None:
+                # A shade for each point
+                pointShades = self.pointShades.tolist()
+                s = [tuple(pointShades[v:v + 3]) for v in range(0, len(pointShades), 3)]
+                shades = [(s[indices[i]], s[indices[i + 1]], s[indices[i + 2]]) for i in range(0, len(indices), 3)]
+            else:
+                shades = [tuple(shades[i:i + 3]) for i in range(0, len(shades), 3)]
+            self.cache = [(n[indices[i]], u[indices[i]], n[indices[i + 1]], u[indices[i + 1]], n[indices[i + 2]], u[indices[i + 2]], shades[t], ids[t], self.users[t]) for t, i in zip(range(len(ids)), range(0, len(indices), 3))]
+        return self.cache
+
+    def ClearCache(self):
+        self.cache = None
+
+    def SetItem(self, index, item, value):
+        self.cache = None
+        match item:
+            case 0 | 1 | 2:
+                v = int(self.indices[index * 3 + item])
+                self.points[v * 3] = value[0]
+                self.points[v * 3 + 1] = value[1]
+                self.points[v * 3 + 2] = value[2]
+                if len(value) == 5:
+                    self.normals[v * 3] = value[3][0]
+                    self.normals[v * 3 + 1] = value[3][1]
+                    self.normals[v * 3 + 2] = value[3][2]
+                    self.uvs[v * 2] = value[4][0]
+                    self.uvs[v * 2 + 1] = value[4][1]
+            case 3:
+                if type(value[0]) in (list, tuple):
+                    # A shade for each point
+                    if self.pointShades is None:
+                        self.pointShades = BufferArray([0.0] * len(self.points))
+                    for p in range(3):
+                        v = int(self.indices[index * 3 + p])
+                        self.pointShades[v * 3] = value[p][0]
+                        self.pointShades[v * 3 + 1] = value[p][1]
+                        self.pointShades[v * 3 + 2] = value[p][2]
+                    value = VectorDivF(VectorAdd(VectorAdd(value[0], value[1]), value[2]), 3)
+                else:
+                    self.pointShades = None
+                self.shades[index * 3] = value[0]
+                self.shades[index * 3 + 1] = value[1]
+                self.shades[index * 3 + 2] = value[2]
+            case 4:
+                self.colours[index * 3] = value[0]
+                self.colours[index * 3 + 1] = value[1]
+                self.colours[index * 3 + 2] = value[2]
+            case 5:
+                self.ids[index] = value
+            case 6:
+                self.users[index] = value
+            case _:
+                raise IndexError("Tri index out of range")
+
+    def SetColour(self, vColour):
+        for i in range(0, len(self.colours), 3):
+            self.colours[i] = vColour[0]
+            self.colours[i + 1] = vColour[1]
+            self.colours[i + 2] = vColour[2]
+
+    # Returns the tris as regular lists
+    def ToTris(self):
+        return [tri[:] for tri in self]
+
+    def GetClass(self):
+        return "MeshBuffer"
+
+    def __repr__(self):
+        return "Z3dPy MeshBuffer:\n\tTris: " + str(len(self)) + "\n\tPoints: " + str(self.GetPointCount()) + "\n\tNumPy: " + str(np is not None) + "\n\t"
+
+# BufferTri:
+# A view of one tri in a MeshBuffer.
+
+class BufferTri():
+    __slots__ = ("buffer", "index")
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    def __len__(self):
+        return 7
+
+    def __getitem__(self, item):
+        if type(item) is slice:
+            return [self.buffer.GetItem(self.index, i) for i in range(7)[item]]
+        if item < 0:
+            item += 7
+        return self.buffer.GetItem(self.index, item)
+
+    def __setitem__(self, item, value):
+        if item < 0:
+            item += 7
+        self.buffer.SetItem(self.index, item, value)
+
+    def __iter__(self):
+        return (self.buffer.GetItem(self.index, i) for i in range(7))
+
+    def __repr__(self):
+        return str(self[:])
+
+# Usage:
+'''
+# Loading straight into a buffer
+myMesh = z3dpy.LoadMesh("z3dpy/mesh/suzanne.obj", buffer=True)
+
+# or converting an existing mesh
+myMesh.tris = z3dpy.MeshBuffer(myMesh.tris)
+
+# Tris can still be looped through like before
+for tri in myMesh.tris:
+    print(z3dpy.TriGetColour(tri))
+'''
+
 # Meshes:
 #
 # Colour is copied to triangles, used when drawing.
@@ -221,7 +563,13 @@ def SHADER_SIMPLE(tri): return VectorMulF(tri[4], max(-TriGetNormal(tri)[2], 0))
 
 def SHADER_DYNAMIC(tri): return VectorMul(tri[4], CheapLighting(tri))
 
-def SHADER_STATIC(tri): return VectorMul(tri[4], tri[3])
+def SHADER_STATIC(tri):
+    if TriHasPointShades(tri):
+        # Baked for each point, gives a colour for each point
+        if TriHasPointColours(tri):
+            return [VectorMul(tri[4][0], tri[3][0]), VectorMul(tri[4][1], tri[3][1]), VectorMul(tri[4][2], tri[3][2])]
+        return [VectorMul(tri[4], tri[3][0]), VectorMul(tri[4], tri[3][1]), VectorMul(tri[4], tri[3][2])]
+    return VectorMul(tri[4], tri[3])
 
 class Material():
     def Local(tri):
@@ -257,12 +605,25 @@ class Mesh():
         self.frame = frame
         self.visible = visible
         self.user = 0
+        self.bounds = None
+        self.bvh = None
         if colour[0] == colour[1] == colour[2] == 255:
             self.SetColour(colour)
 
+    # Finds the bounding sphere and box of the tris, LoadMesh() does this
+    # already. Meshes without bounds are always drawn, so call it again
+    # after changing the tris.
+    def UpdateBounds(self):
+        if self.frame == -1:
+            self.bounds = TrisGetBounds(self.tris)
+        else:
+            self.bounds = TrisGetBounds([tri for frame in self.tris for tri in frame])
+
     def SetColour(self, vColour):
         self.colour = vColour
-        if self.frame == -1:
+        if type(self.tris) is MeshBuffer:
+            self.tris.SetColour(vColour)
+        elif self.frame == -1:
             for tri in self.tris:
                 TriSetColour(tri, vColour)
         else:
@@ -302,9 +663,9 @@ trainMesh = Mesh((), [0, 0, 0])
 #
 # Enable collisions with z3dpy.ThingSetupHitbox(myThing)
 
-# Type: 0 = Sphere, 2 = Cube
+# Type: 0 = Sphere, 2 = Cube, 3 = Mesh
 # Radius: radius of the sphere, or length/width of
-# the cube
+# the cube. Mesh hitboxes cover the thing's meshes, see MeshHitbox()
 # Height: height of the cube.
 # Id: Objects with the same ID will check for collisions.
 # Everything is 0 by default, so if unsure, use that.
@@ -313,8 +674,9 @@ trainMesh = Mesh((), [0, 0, 0])
 HITBOX_SPHERE = 0
 #HITBOX_CYLINDER = 1
 HITBOX_BOX = 2
+HITBOX_MESH = 3
 
-hitboxTypes = ["Sphere", "Cylinder", "Box"]
+hitboxTypes = ["Sphere", "Cylinder", "Box", "Mesh"]
 
 class Hitbox():
     def __init__(self, type=2, id=0, radius=1, height=1):
@@ -366,9 +728,18 @@ class PhysicsBody():
         self.rotVelocity = [0, 0, 0]
         self.rotAcceleration = [0, 0, 0]
         self.user = 0
+        # Sleeping, see BodyAsleep()
+        self.asleep = False
+        self.sleepTimer = 0.0
+        self.sleepState = None
+        self.lastPosition = None
+        self.island = None
+        # Continuous collisions, see SweptHitboxes()
+        self.ccd = False
+        self.previousPosition = None
 
     def __repr__(self):
-        return "Z3dPy PhysicsBody:\n\tVelocity: " + str(self.velocity) + "\n\tAcceleration: " + str(self.acceleration) + "\n\tMass: " + str(self.mass) + "\n\tFriction: " + str(self.friction) + "\n\tBounciness: " + str(self.bounciness) + "\n\tRotational Velocity: " + str(self.rotVelocity) + "\n\tRotational Acceleration: " + str(self.rotAcceleration) + "\n\t"
+        return "Z3dPy PhysicsBody:\n\tVelocity: " + str(self.velocity) + "\n\tAcceleration: " + str(self.acceleration) + "\n\tMass: " + str(self.mass) + "\n\tFriction: " + str(self.friction) + "\n\tBounciness: " + str(self.bounciness) + "\n\tRotational Velocity: " + str(self.rotVelocity) + "\n\tRotational Acceleration: " + str(self.rotAcceleration) + "\n\tAsleep: " + str(self.asleep) + "\n\t"
 
 
 # Things:
@@ -383,7 +754,7 @@ class PhysicsBody():
 # -2 means the rotation value is the PointAt target
 
 class Thing():
-    def __init__(self, meshList, position=[0, 0, 0], rotation=[0, 0, 0], scale=[1.0, 1.0, 1.0], hitbox=None, physics=None, movable=True, visible=True):
+    def __init__(self, meshList, position=[0, 0, 0], rotation=[0, 0, 0], scale=[1.0, 1.0, 1.0], hitbox=None, physics=None, movable=True, visible=True, drawDistance=0):
         self.meshes = meshList
         self.position = position
         self.rotation = rotation
@@ -393,6 +764,8 @@ class Thing():
         self.movable = movable
         self.internalid = 0
         self.visible = visible
+        # Things further than this from the camera aren't drawn, 0 is no limit
+        self.drawDistance = drawDistance
         self.user = 0
     
     def __repr__(self):
@@ -411,6 +784,24 @@ class Thing():
     def SetShader(self, shader):
         for mesh in self.meshes:
             mesh.shader = shader
+
+    # World-space bounds of all the meshes, in the same format as
+    # Mesh.bounds. None if any of the meshes don't have bounds.
+    def GetBounds(self):
+        boxes = []
+        for m in self.meshes:
+            if m.bounds is None:
+                return None
+            if self.movable:
+                boxes.append(BoundsTransform(m.bounds, VectorAdd(m.position, self.position), VectorAdd(m.rotation, self.rotation), VectorMul(m.scale, self.scale)))
+            else:
+                boxes.append(BoundsTransform(m.bounds, VectorAdd(m.position, self.position)))
+        if not boxes:
+            return None
+        bmin = [min(b[2][0] for b in boxes), min(b[2][1] for b in boxes), min(b[2][2] for b in boxes)]
+        bmax = [max(b[3][0] for b in boxes), max(b[3][1] for b in boxes), max(b[3][2] for b in boxes)]
+        centre = VectorMulF(VectorAdd(bmin, bmax), 0.5)
+        return [centre, max(VectorGetLength(VectorSub(b[0], centre)) + b[1] for b in boxes), bmin, bmax]
     
     def SetId(self, id):
         for mesh in self.meshes:
@@ -1321,7 +1712,8 @@ def TriDiv(t, v): return [VectorUVDiv(t[0], v), VectorUVDiv(t[1], v), VectorUVDi
 def TriDivF(t, f): return [VectorUVDivF(t[0], f), VectorUVDivF(t[1], f), VectorUVDivF(t[2], f), t[3], t[4], t[5], t[6]]
 
 def TriClipAgainstPlane(tri, pPos, pNrm):
-    test = [ShortestPointToPlane(tri[0], pNrm, pPos) >= 0, ShortestPointToPlane(tri[1], pNrm, pPos) >= 0, ShortestPointToPlane(tri[2], pNrm, pPos) >= 0]
+    dist = [ShortestPointToPlane(tri[0], pNrm, pPos), ShortestPointToPlane(tri[1], pNrm, pPos), ShortestPointToPlane(tri[2], pNrm, pPos)]
+    test = [dist[0] >= 0, dist[1] >= 0, dist[2] >= 0]
     match test.count(True):
         case 0:
             return []
@@ -1333,6 +1725,8 @@ def TriClipAgainstPlane(tri, pPos, pNrm):
             second = test.index(False)
             third = test.index(False, second + 1)
             outT1 = [tri[first], VectorUVIntersectPlane(pPos, pNrm, tri[first], tri[third]), VectorUVIntersectPlane(pPos, pNrm, tri[first], tri[second]), tri[3], tri[4], tri[5], tri[6]]
+            if TriHasPointColours(tri):
+                outT1[4] = (tri[4][first], ColourIntersectPlane(tri[4], dist, first, third), ColourIntersectPlane(tri[4], dist, first, second))
             yield outT1
 
         case 2:
@@ -1341,9 +1735,28 @@ def TriClipAgainstPlane(tri, pPos, pNrm):
             third = test.index(False)
             outT1 = [tri[first], tri[second], VectorUVIntersectPlane(pPos, pNrm, tri[second], tri[third]), tri[3], tri[4], tri[5], tri[6]]
             outT2 = [tri[first], outT1[2], VectorUVIntersectPlane(pPos, pNrm, tri[first], tri[third]), tri[3], tri[4], tri[5], tri[6]]
+            if TriHasPointColours(tri):
+                middle = ColourIntersectPlane(tri[4], dist, second, third)
+                outT1[4] = (tri[4][first], tri[4][second], middle)
+                outT2[4] = (tri[4][first], middle, ColourIntersectPlane(tri[4], dist, first, third))
             yield outT1
             yield outT2
 
+# A tri's colour can also be three colours, one for each point, to be
+# blended by RASTER_GOURAUD.
+def TriHasPointColours(tri):
+    return type(tri[4][0]) in (list, tuple)
+
+# Same for the baked shade, see BakeLighting(perVertex=True)
+def TriHasPointShades(tri):
+    return type(tri[3][0]) in (list, tuple)
+
+# The colour where the line from point a to b crosses the plane, using
+# the distances from TriClipAgainstPlane()
+def ColourIntersectPlane(colours, dist, a, b):
+    t = dist[a] / (dist[a] - dist[b])
+    return ((colours[b][0] - colours[a][0]) * t + colours[a][0], (colours[b][1] - colours[a][1]) * t + colours[a][1], (colours[b][2] - colours[a][2]) * t + colours[a][2])
+
 def TriAverage(tri):
     return [(tri[0][0] + tri[1][0] + tri[2][0]) * 0.333333, (tri[0][1] + tri[1][1] + tri[2][1]) * 0.333333, (tri[0][1] + tri[1][1] + tri[2][1]) * 0.33333]
 
@@ -1358,10 +1771,72 @@ def TriSortFurthest(n):
 def TriSortClosest(n):
     return min(n[0][2], n[1][2], n[2][2])
 
+# SortTris()
+# Sorts tris the same way as list.sort(key=sortKey). For the three sorting
+# functions above, the keys are worked out all at once, and sorted with a
+# radix sort over 65536 depth buckets, instead of calling the function for
+# every tri. Tris in the same bucket keep the order they came in.
+#
+# Cache is something to remember this list by, for sortReuseFrames, like
+# the list of things it came from. It's checked with is, so a different list
+# never gets another one's order.
+
+def SortTris(tris, sortKey=TriSortAverage, bReverse=True, cache=None):
+    if sortKey is None or len(tris) < 2:
+        return tris
+    if cache is not None and sortReuseFrames:
+        # Taken out, and only put back while it has frames left
+        last = sortCache.pop(id(cache), None)
+        if last is not None and last[3] is cache and last[1] == len(tris):
+            last[2] -= 1
+            if last[2]:
+                sortCache[id(cache)] = last
+            return list(itemgetter(*last[0])(tris))
+    if np is None or sortKey not in (TriSortAverage, TriSortFurthest, TriSortClosest):
+        if cache is None or not sortReuseFrames:
+            tris.sort(key=sortKey, reverse=bReverse)
+            return tris
+        order = sorted(range(len(tris)), key=lambda i: sortKey(tris[i]), reverse=bReverse)
+    else:
+        if sortKey is TriSortAverage:
+            keys = np.array([t[0][2] + t[1][2] + t[2][2] for t in tris])
+        else:
+            z = np.array([[t[0][2] for t in tris], [t[1][2] for t in tris], [t[2][2] for t in tris]])
+            keys = z.max(0) if sortKey is TriSortFurthest else z.min(0)
+        lo = keys.min()
+        hi = keys.max()
+        if lo == hi:
+            return tris
+        if bReverse:
+            keys = (hi - keys) * (65535 / (hi - lo))
+        else:
+            keys = (keys - lo) * (65535 / (hi - lo))
+        # NumPy's stable sort on 16-bit numbers is a radix sort
+        order = np.argsort(keys.astype(np.uint16), kind='stable').tolist()
+    if cache is not None and sortReuseFrames:
+        sortCache[id(cache)] = [order, len(tris), sortReuseFrames, cache]
+        while len(sortCache) > sortCacheSize:
+            # The one used longest ago
+            del sortCache[next(iter(sortCache))]
+    return list(itemgetter(*order)(tris))
+
 def TriClipAgainstZ(tri, distance=iC[4]):
     return TriClipAgainstPlane(tri, (0.0, 0.0, distance), (0.0, 0.0, 1.0))
 
+# Clips a view-space tri against the camera's near and far planes
+def TriClipAgainstNearFar(tri):
+    near = iC[4]
+    far = iC[5]
+    if near <= tri[0][2] <= far and near <= tri[1][2] <= far and near <= tri[2][2] <= far:
+        return [tri]
+    return [f for n in TriClipAgainstPlane(tri, (0.0, 0.0, near), (0.0, 0.0, 1.0)) for f in TriClipAgainstPlane(n, (0.0, 0.0, far), (0.0, 0.0, -1.0))]
+
 def TriClipAgainstScreenEdges(tri):
+    # Most tris are already on screen
+    w = screenSize[0] - 1.0
+    h = screenSize[1] - 1.0
+    if 0.0 <= tri[0][0] <= w and 0.0 <= tri[1][0] <= w and 0.0 <= tri[2][0] <= w and 0.0 <= tri[0][1] <= h and 0.0 <= tri[1][1] <= h and 0.0 <= tri[2][1] <= h:
+        return [tri]
     output = []
     for t in TriClipAgainstPlane(tri, (0.0, 0.0, 0.0), (0.0, 1.0, 0.0)):
         for r in TriClipAgainstPlane(t, (0.0, screenSize[1] - 1.0, 0.0), (0.0, -1.0, 0.0)):
@@ -1393,7 +1868,47 @@ def Triangulate(list_of_vectors):
 #
 #==========================================================================
 
-def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale=(1.0, 1.0, 1.0), colour=(255, 255, 255), id=0, material=MATERIAL_UNLIT, cull=True, visible=True):
+# Bounds:
+#
+# [centre, radius, min, max]
+# A bounding sphere, and an axis-aligned box from min to max.
+
+def TrisGetBounds(tris):
+    if type(tris) is MeshBuffer:
+        points = [tris.points[p:p + 3].tolist() for p in range(0, len(tris.points), 3)]
+    else:
+        points = [point for tri in tris for point in tri[:3]]
+    if not points:
+        return None
+    bmin = [min(p[0] for p in points), min(p[1] for p in points), min(p[2] for p in points)]
+    bmax = [max(p[0] for p in points), max(p[1] for p in points), max(p[2] for p in points)]
+    centre = VectorMulF(VectorAdd(bmin, bmax), 0.5)
+    return [centre, sqrt(max((p[0] - centre[0]) ** 2 + (p[1] - centre[1]) ** 2 + (p[2] - centre[2]) ** 2 for p in points)), bmin, bmax]
+
+# Moves local bounds into the world, the same way RasterPt1() moves the tris.
+# Without a rotation it's only translated, like RasterPt1Static()
+def BoundsTransform(bounds, pos, rot=None, scale=(1.0, 1.0, 1.0)):
+    if rot is None:
+        return [VectorAdd(bounds[0], pos), bounds[1], VectorAdd(bounds[2], pos), VectorAdd(bounds[3], pos)]
+    return BoundsTransformMatrix(bounds, PointAtMatrix(pos, VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0))), RotTo(rot, (0.0, 1.0, 0.0))), scale)
+
+# Same thing with the PointAt matrix already made, like ThingMeshMatrices() gives
+def BoundsTransformMatrix(bounds, mW, scale=(1.0, 1.0, 1.0)):
+    middle = Vec3MatrixMul(VectorMulF(VectorMul(VectorAdd(bounds[2], bounds[3]), scale), 0.5), mW)
+    extent = [abs(e) for e in VectorMulF(VectorMul(VectorSub(bounds[3], bounds[2]), scale), 0.5)]
+    # Size of the rotated box along each axis
+    extent = [extent[0] * abs(mW[0][a]) + extent[1] * abs(mW[1][a]) + extent[2] * abs(mW[2][a]) for a in range(3)]
+    return [Vec3MatrixMul(VectorMul(bounds[0], scale), mW), bounds[1] * max(abs(scale[0]), abs(scale[1]), abs(scale[2])), VectorSub(middle, extent), VectorAdd(middle, extent)]
+
+# Set buffer to True to load the tris into a MeshBuffer
+def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale=(1.0, 1.0, 1.0), colour=(255, 255, 255), id=0, material=MATERIAL_UNLIT, cull=True, visible=True, buffer=False):
+    output = ReadMeshFile(filename, position, rotation, scale, colour, id, material, cull, visible, buffer)
+    # Bounds for frustum culling
+    for mesh in (output if type(output) is list else [output]):
+        mesh.UpdateBounds()
+    return output
+
+def ReadMeshFile(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale=(1.0, 1.0, 1.0), colour=(255, 255, 255), id=0, material=MATERIAL_UNLIT, cull=True, visible=True, buffer=False):
     try:
         file = open(filename)
     except FileNotFoundError:
@@ -1404,7 +1919,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                 raise FileNotFoundError("Can't load placeholder mesh. (Is the z3dpy folder missing?)")
             else:
                 print(filename[:-4], "was not found, replacing...")
-                return LoadMesh("z3dpy/mesh/error.obj", position, rotation, scale, colour, id, material, cull, visible)
+                return LoadMesh("z3dpy/mesh/error.obj", position, rotation, scale, colour, id, material, cull, visible, buffer)
 
     match filename[-3:]:
         case "obj":
@@ -1507,6 +2022,9 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
 
                 uvLen = len(storedUVs)
                 if mat == -1:
+                    if buffer and not uvLen:
+                        # Points are already shared, no need to look for them
+                        return Mesh(MeshBuffer(verts=verts, faces=triangles), position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
                     for tr in range(len(triangles)):
                         nt = Tri(verts[triangles[tr][0]], verts[triangles[tr][1]], verts[triangles[tr][2]])
                         if uvLen:
@@ -1515,7 +2033,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                             nt[2][4] = uvs[storedUVs[tr][2] - 1]
                         output.append(nt)
 
-                    return Mesh(tuple(output), position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+                    return Mesh(MeshBuffer(output) if buffer else tuple(output), position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
                 else:
 
                     gathered.append(triangles)
@@ -1529,7 +2047,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                                 nt[1][4] = uvs[storedUVs[tr][1] - 1]
                                 nt[2][4] = uvs[storedUVs[tr][2] - 1]
 
-                    meshes = [Mesh(tuple(trS), position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible) for trS in matoutputs]
+                    meshes = [Mesh(MeshBuffer(trS) if buffer else tuple(trS), position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible) for trS in matoutputs]
                     colours = colours[1:]
                     colours.reverse()
 
@@ -1642,7 +2160,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
 
                         tris.append(Tri(VectorUV(v1[0], v1[1], v1[2], n1, uv1), VectorUV(v2[0], v2[1], v2[2], n2, uv2), VectorUV(v3[0], v3[1], v3[2], n3, uv3)))
 
-            return Mesh(tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+            return Mesh(MeshBuffer(tris) if buffer else tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
             
         case "x3d":
             # Extensible 3D
@@ -1666,7 +2184,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                             tries[-1].append(int(f))
                     tries.pop()
                     tris += [Tri(verts[t[0]], verts[t[1]], verts[t[2]]) for t in tries]
-            return Mesh(tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+            return Mesh(MeshBuffer(tris) if buffer else tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
             
         case "stl":
             # STL
@@ -1714,7 +2232,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                         file.read1(2)
                         tris.append(Tri(VectorUV(p1[0], p1[1], p1[2], normal), VectorUV(p2[0], p2[1], p2[2], normal), VectorUV(p3[0], p3[1], p3[2], normal)))
 
-            return Mesh(tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+            return Mesh(MeshBuffer(tris) if buffer else tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
             
         case "ply":
             # Stanford PLY
@@ -1782,10 +2300,12 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                         split = file.readline()[:-1].split(" ")
                         if split[0] != '3':
                             # Triangulating N-gons
-                            ngon = [verts[int(v)] for v in split[1:]]
-                            tris += Triangulate(ngon)
+                            ngon = [int(v) for v in split[1:]]
+                            tris += Triangulate([verts[v] for v in ngon])
+                            faces += [[ngon[0], ngon[n - 1], ngon[n]] for n in range(2, len(ngon))]
                         else:
                             tris += [Tri(verts[int(split[1])], verts[int(split[2])], verts[int(split[3])])]
+                            faces.append([int(split[1]), int(split[2]), int(split[3])])
 
                 else:
                     # Binary
@@ -1823,12 +2343,15 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
 
                     for i in range(faceCount):
                         size = unpack("B", file.read1(1))[0]
+                        ngon = [unpack("I", file.read1(4))[0] for i in range(size)]
                         if size != 3:
-                            ngon = [verts[unpack("I", file.read1(4))[0]] for i in range(size)]
-                            tris += Triangulate(ngon)
+                            tris += Triangulate([verts[v] for v in ngon])
+                            faces += [[ngon[0], ngon[n - 1], ngon[n]] for n in range(2, len(ngon))]
                         else:
-                            tris.append(Tri(verts[unpack("I", file.read1(4))[0]], verts[unpack("I", file.read1(4))[0]], verts[unpack("I", file.read1(4))[0]]))
-            return Mesh(tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+                            tris.append(Tri(verts[ngon[0]], verts[ngon[1]], verts[ngon[2]]))
+                            faces.append(ngon)
+            # The faces already say which points are shared
+            return Mesh(MeshBuffer(verts=verts, faces=faces) if buffer else tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
                 
             
         case "glb":
@@ -1922,7 +2445,7 @@ def LoadMesh(filename, position=(0.0, 0.0, 0.0), rotation=[0.0, 0.0, 0.0], scale
                         
                         tris = Tri(VectorUV(p1[0], p1[1], p1[2], n1, uv1), VectorUV(p2[0], p2[1], p2[2], n2, uv2), VectorUV(p3[0], p3[1], p3[2], n3, uv3))
 
-                    return Mesh(tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
+                    return Mesh(MeshBuffer(tris) if buffer else tris, position=position, rotation=rotation, scale=scale, colour=colour, id=id, cull=cull, material=material, visible=visible)
             
 
 def MeshSetColour(mesh, colour):
@@ -1967,6 +2490,7 @@ def LoadAniMesh(filename, position=[0.0, 0.0, 0.0], rotation=[0.0, 0.0, 0.0], sc
                     newpoint = [float(vert) for vert in vs]
                     points[int(line[:line.index(' ')])] = VectorUV(newpoint[0], newpoint[1], newpoint[2])
 
+        newMsh.UpdateBounds()
         return newMsh
 
     else:
@@ -2009,6 +2533,7 @@ def LoadAniMesh(filename, position=[0.0, 0.0, 0.0], rotation=[0.0, 0.0, 0.0], sc
         for f in range(st, nd):
             newMsh.tris.append(LoadMesh(filename[:-4] + str(f) + ".obj", position, rotation, scale, colour, id, material, cull, visible).tris)
 
+        newMsh.UpdateBounds()
         return newMsh
 
 def GlTFComponentTypeToUnpackParameters(value):
@@ -2048,11 +2573,16 @@ except:
     print("Failed to load built-in meshes. (is the z3dpy folder missing?)")
 
 def MeshUniqPoints(mesh):
-    buffer = ()
+    if type(mesh.tris) is MeshBuffer:
+        for v in range(mesh.tris.GetPointCount()):
+            yield mesh.tris.GetVert(v)
+        return
+    found = set()
     for tri in mesh.tris:
         for point in tri[:3]:
-            if point not in buffer:
-                buffer += (point,)
+            key = (point[0], point[1], point[2], tuple(point[3]), tuple(point[4]))
+            if key not in found:
+                found.add(key)
                 yield point
 
 
@@ -2131,16 +2661,13 @@ def CreateAOBJ(filename):
 
 
 def MatrixMakeRotX(deg):
-    rad = deg * 0.0174
-    
+    return RotationMatrix((1, 0, 0), deg)
 
 def MatrixMakeRotY(deg):
-    rad = deg * 0.0174
-    
+    return RotationMatrix((0, 1, 0), deg)
 
 def MatrixMakeRotZ(deg):
-    rad = deg * 0.0174
-    
+    return RotationMatrix((0, 0, 1), deg)
 
 def RotationMatrix(axis, degrees):
     rad = degrees * 0.0174
@@ -2160,8 +2687,8 @@ def Vec3MatrixMul(v, m):
 
 def MatrixMatrixMul(m1, m2):
     output = [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
-    for c in range(0, 3):
-        for r in range(0, 3):
+    for c in range(0, 4):
+        for r in range(0, 4):
             output[r][c] = m1[r][0] * m2[0][c] + m1[r][1] * m2[1][c] + m1[r][2] * m2[2][c] + m1[r][3] * m2[3][c]
     return tuple(output)
 
@@ -2237,34 +2764,516 @@ def RayIntersectTri(ray, tri):
                     return (True, VectorAdd(raySt, VectorMulF(rayDr, l)), l, tri)
     return (False,)
 
+# BVH:
+#
+# A bounding volume hierarchy of a mesh's tris, in the mesh's own space.
+# Rays are moved into the mesh's space, instead of moving every tri into
+# the world, and only the tris in boxes the ray goes through are tested.
+#
+# Meshes build one the first time a ray hits them, see MeshGetBVH().
+#
+# Each node is:
+# [0] is the min corner of the box
+# [1] is the max corner of the box
+# [2] is the first child, or -1 if it's a leaf
+# [3] is the second child, or the start of it's tris in order
+# [4] is the end of it's tris in order
+
+class BVH():
+    def __init__(self, tris, leafSize=4):
+        self.tris = tris
+        self.leafSize = leafSize
+        self.nodes = []
+        self.arrays = None
+        self.orderArray = None
+        # Point 1 and both edges of each tri, for the intersection test
+        self.prims = []
+        centres = []
+        boxes = []
+        for tri in tris:
+            p1 = tri[0][:3]
+            p2 = tri[1][:3]
+            p3 = tri[2][:3]
+            self.prims.append((p1, VectorSub(p2, p1), VectorSub(p3, p1)))
+            boxes.append(([min(p1[0], p2[0], p3[0]), min(p1[1], p2[1], p3[1]), min(p1[2], p2[2], p3[2])], [max(p1[0], p2[0], p3[0]), max(p1[1], p2[1], p3[1]), max(p1[2], p2[2], p3[2])]))
+            centres.append([(p1[0] + p2[0] + p3[0]) / 3, (p1[1] + p2[1] + p3[1]) / 3, (p1[2] + p2[2] + p3[2]) / 3])
+        self.order = list(range(len(self.prims)))
+        if self.order:
+            self.BuildNode(0, len(self.order), centres, boxes)
+
+    # The tris (point 1, edge 1, edge 2) and the nodes (min, max, [2], [3], [4])
+    # as arrays, for RaycastBatch()
+    def GetArrays(self):
+        if self.arrays is None:
+            self.orderArray = np.array(self.order, dtype=np.int64)
+            self.arrays = (np.array([p[0] for p in self.prims], dtype=np.float64).reshape(-1, 3), np.array([p[1] for p in self.prims], dtype=np.float64).reshape(-1, 3), np.array([p[2] for p in self.prims], dtype=np.float64).reshape(-1, 3), np.array([n[0] for n in self.nodes], dtype=np.float64).reshape(-1, 3), np.array([n[1] for n in self.nodes], dtype=np.float64).reshape(-1, 3), np.array([n[2] for n in self.nodes], dtype=np.int64), np.array([n[3] for n in self.nodes], dtype=np.int64), np.array([n[4] for n in self.nodes], dtype=np.int64))
+        return self.arrays
+
+    def __repr__(self):
+        return "Z3dPy BVH:\n\tTris: " + str(len(self.prims)) + "\n\tNodes: " + str(len(self.nodes)) + "\n\t"
+
+    def BuildNode(self, start, end, centres, boxes):
+        index = len(self.nodes)
+        tris = self.order[start:end]
+        self.nodes.append([[min(boxes[t][0][0] for t in tris), min(boxes[t][0][1] for t in tris), min(boxes[t][0][2] for t in tris)], [max(boxes[t][1][0] for t in tris), max(boxes[t][1][1] for t in tris), max(boxes[t][1][2] for t in tris)], -1, start, end])
+        if end - start <= self.leafSize:
+            return index
+        # Splitting down the middle of the longest side
+        low = [min(centres[t][a] for t in tris) for a in range(3)]
+        size = [max(centres[t][a] for t in tris) - low[a] for a in range(3)]
+        axis = size.index(max(size))
+        if not size[axis]:
+            return index
+        tris.sort(key=lambda t: centres[t][axis])
+        self.order[start:end] = tris
+        middle = (start + end) // 2
+        self.nodes[index][2] = self.BuildNode(start, middle, centres, boxes)
+        self.nodes[index][3] = self.BuildNode(middle, end, centres, boxes)
+        return index
+
+    # Indices of the tris whose boxes overlap the box from lo to hi
+    def BoxQuery(self, lo, hi):
+        found = []
+        if not self.nodes:
+            return found
+        nodes = self.nodes
+        stack = [0]
+        while stack:
+            node = nodes[stack.pop()]
+            nlo = node[0]
+            nhi = node[1]
+            if nlo[0] > hi[0] or nhi[0] < lo[0] or nlo[1] > hi[1] or nhi[1] < lo[1] or nlo[2] > hi[2] or nhi[2] < lo[2]:
+                continue
+            if node[2] == -1:
+                found += self.order[node[3]:node[4]]
+            else:
+                stack.append(node[2])
+                stack.append(node[3])
+        return found
+
+    # Returns (distance, index of the tri) of the closest hit before far, or
+    # None. Direction doesn't have to be normalized, distance is measured
+    # in lengths of it.
+    def Intersect(self, origin, direction, far):
+        if not self.nodes:
+            return None
+        ox, oy, oz = origin[0], origin[1], origin[2]
+        dx, dy, dz = direction[0], direction[1], direction[2]
+        # Huge instead of infinite, so a ray along a side doesn't make NaNs
+        ix = 1 / dx if dx else 1e30
+        iy = 1 / dy if dy else 1e30
+        iz = 1 / dz if dz else 1e30
+        nodes = self.nodes
+        prims = self.prims
+        best = far
+        found = -1
+        stack = [0]
+        while stack:
+            node = nodes[stack.pop()]
+            # Slab test, skipping boxes further than the closest hit so far
+            lo = node[0]
+            hi = node[1]
+            t1 = (lo[0] - ox) * ix
+            t2 = (hi[0] - ox) * ix
+            if t1 > t2:
+                t1, t2 = t2, t1
+            near = t1
+            distance = t2
+            t1 = (lo[1] - oy) * iy
+            t2 = (hi[1] - oy) * iy
+            if t1 > t2:
+                t1, t2 = t2, t1
+            near = max(near, t1)
+            distance = min(distance, t2)
+            t1 = (lo[2] - oz) * iz
+            t2 = (hi[2] - oz) * iz
+            if t1 > t2:
+                t1, t2 = t2, t1
+            near = max(near, t1)
+            distance = min(distance, t2)
+            if near > distance or distance <= 0.0 or near >= best:
+                continue
+            if node[2] != -1:
+                stack.append(node[3])
+                stack.append(node[2])
+                continue
+            for t in self.order[node[3]:node[4]]:
+                # Möller-Trumbore
+                p, e1, e2 = prims[t]
+                hx = dy * e2[2] - dz * e2[1]
+                hy = dz * e2[0] - dx * e2[2]
+                hz = dx * e2[1] - dy * e2[0]
+                a = e1[0] * hx + e1[1] * hy + e1[2] * hz
+                if -1e-12 < a < 1e-12:
+                    continue
+                f = 1 / a
+                sx = ox - p[0]
+                sy = oy - p[1]
+                sz = oz - p[2]
+                u = (sx * hx + sy * hy + sz * hz) * f
+                if not 0.0 < u < 1.0:
+                    continue
+                qx = sy * e1[2] - sz * e1[1]
+                qy = sz * e1[0] - sx * e1[2]
+                qz = sx * e1[1] - sy * e1[0]
+                v = (dx * qx + dy * qy + dz * qz) * f
+                if v <= 0.0 or u + v >= 1.0:
+                    continue
+                l = (e2[0] * qx + e2[1] * qy + e2[2] * qz) * f
+                if 0.0 < l < best:
+                    best = l
+                    found = t
+        if found == -1:
+            return None
+        return (best, found)
+
+# Builds the mesh's BVH if it doesn't have one yet. If the tris are
+# changed in place, set myMesh.bvh = None so it's built again.
+def MeshGetBVH(mesh):
+    tris = mesh.tris if mesh.frame == -1 else mesh.tris[mesh.frame]
+    if mesh.bvh is None or mesh.bvh.tris is not tris:
+        mesh.bvh = BVH(tris)
+    return mesh.bvh
+
+# Ray test against a mesh placed with the PointAt matrix mW, like
+# TransformTris(). Returns the closest hit, in the same format as
+# RayIntersectTri(), with the tri moved into the world.
+def RayIntersectMeshMatrix(ray, mesh, mW, scale=(1.0, 1.0, 1.0)):
+    rayDr = RayGetDirection(ray)
+    # Into the mesh's space, the matrix only rotates so it's inverse is it's transpose
+    o = VectorSub(ray[1], mW[3])
+    origin = [DotProduct(o, mW[0][:3]) / scale[0], DotProduct(o, mW[1][:3]) / scale[1], DotProduct(o, mW[2][:3]) / scale[2]]
+    direction = [DotProduct(rayDr, mW[0][:3]) / scale[0], DotProduct(rayDr, mW[1][:3]) / scale[1], DotProduct(rayDr, mW[2][:3]) / scale[2]]
+    bvh = MeshGetBVH(mesh)
+    hit = bvh.Intersect(origin, direction, RayGetLength(ray))
+    if hit is None:
+        return (False,)
+    return (True, VectorAdd(ray[1], VectorMulF(rayDr, hit[0])), hit[0], TriMatrixMul(TriMul(bvh.tris[hit[1]], scale), mW))
+
 def RayIntersectMesh(ray, mesh):
-    for t in TransformTris(mesh.tris, mesh.position, RotTo(mesh.rotation, (0, 0, 1)), (0, 1, 0)):
-        hit = RayIntersectTri(ray, t)
-        if hit[0]:
-            return hit
-    return (False,)
+    trg = VectorAdd(mesh.position, RotTo(mesh.rotation, (0.0, 0.0, 1.0)))
+    return RayIntersectMeshMatrix(ray, mesh, PointAtMatrix(mesh.position, trg, RotTo(mesh.rotation, (0.0, 1.0, 0.0))), mesh.scale)
 
 # Does a ray intersection test with the hitbox
 def RayIntersectThingSimple(ray, thing):
-    hit = RayIntersectMesh(ray, thing.hitbox.mesh.tris)
-    if hit[0]:
-        return hit
-    return (False,)
-
-# Does a ray intersection test with each triangle
-def RayIntersectThingComplex(ray, thing):
+    return RayIntersectMeshMatrix(ray, thing.hitbox.mesh, PointAtMatrix(thing.position, VectorAdd(thing.position, (0.0, 0.0, 1.0)), (0.0, 1.0, 0.0)))
+
+# Each of the thing's meshes, with the PointAt matrix and scale it's drawn
+# with. Position and rotation are for dupes, which use the thing's meshes
+# somewhere else.
+def ThingMeshMatrices(thing, position=None, rotation=None):
+    position = thing.position if position is None else position
+    rotation = thing.rotation if rotation is None else rotation
     for m in thing.meshes:
-        if thing.internalid == -2:
-            trg = thing.rotation
+        pos = VectorAdd(m.position, position)
+        if not thing.movable:
+            # Drawn without rotating or scaling, see RasterPt1Static()
+            yield m, PointAtMatrix(pos, VectorAdd(pos, (0.0, 0.0, 1.0)), (0.0, 1.0, 0.0)), (1.0, 1.0, 1.0)
+        elif thing.internalid == -2:
+            yield m, PointAtMatrix(pos, rotation, (0.0, 1.0, 0.0)), VectorMul(m.scale, thing.scale)
         else:
-            fullRot = VectorAdd(m.rotation, thing.rotation)
-            trg = RotTo(fullRot, (0.0, 0.0, 1.0))
-            up = RotTo(fullRot, (0.0, 1.0, 0.0))
-        for t in TransformTris(m.tris, VectorAdd(m.position, thing.position), trg, up, m.scale, m.cull, m.material):
-            inrts = RayIntersectTri(ray, t)
-            if inrts[0]:
-                return inrts
-    return (False,)
+            fullRot = VectorAdd(m.rotation, rotation)
+            yield m, PointAtMatrix(pos, VectorAdd(pos, RotTo(fullRot, (0.0, 0.0, 1.0))), RotTo(fullRot, (0.0, 1.0, 0.0))), VectorMul(m.scale, thing.scale)
+
+# Does a ray intersection test with each triangle, returning the closest hit
+def RayIntersectThingComplex(ray, thing):
+    output = (False,)
+    for m, mW, scale in ThingMeshMatrices(thing):
+        hit = RayIntersectMeshMatrix(ray, m, mW, scale)
+        if hit[0] and (not output[0] or hit[2] < output[2]):
+            output = hit
+    return output
+
+# RaycastBatch()
+# Tests lots of rays at once with NumPy, instead of one Python call each.
+#
+# Starts and ends are lists or (rays, 3) arrays. Target is a Mesh, a Thing,
+# or a list of things (dupes included, like a layer).
+#
+# With anyHit, each ray stops at the first thing it hits, good for
+# checking if something is in the way, the distance may not be the closest.
+#
+# Returns a tuple of arrays, one value for each ray:
+# [0] is wether or not it hit
+# [1] is distance
+# [2] is location
+# [3] is the index of the tri in it's mesh
+# [4] is the index of the thing in the list
+# [5] is the index of the mesh in the thing
+
+# Usage:
+'''
+starts = [enemy.position for enemy in myEnemies]
+ends = [myCharacter.position] * len(myEnemies)
+
+hit = z3dpy.RaycastBatch(starts, ends, z3dpy.layers[2], anyHit=True)
+
+for enemy, blocked in zip(myEnemies, hit[0]):
+    if not blocked:
+        # Can see the character
+        pass
+'''
+
+def RaycastBatch(starts, ends, target, anyHit=False):
+    if np is None:
+        raise ImportError("RaycastBatch needs NumPy")
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+    count = len(starts)
+    lengths = np.sqrt(((ends - starts) ** 2).sum(1))
+    directions = (ends - starts) / np.where(lengths, lengths, 1.0)[:, None]
+    best = lengths.copy()
+    hit = np.zeros(count, dtype=bool)
+    tris = np.full(count, -1, dtype=np.int64)
+    things = np.full(count, -1, dtype=np.int64)
+    meshes = np.full(count, -1, dtype=np.int64)
+    if type(target) is Mesh:
+        trg = VectorAdd(target.position, RotTo(target.rotation, (0.0, 0.0, 1.0)))
+        placed = [(0, 0, target, PointAtMatrix(target.position, trg, RotTo(target.rotation, (0.0, 1.0, 0.0))), target.scale)]
+    else:
+        if type(target) is Thing:
+            target = [target]
+        placed = []
+        for i in range(len(target)):
+            t = target[i]
+            if type(t) is list:
+                # Dupe
+                placed += [(i, n, m, mW, scale) for n, (m, mW, scale) in enumerate(ThingMeshMatrices(target[t[0]], t[1], t[2]))]
+            else:
+                placed += [(i, n, m, mW, scale) for n, (m, mW, scale) in enumerate(ThingMeshMatrices(t))]
+
+    for thing, mesh, m, mW, scale in placed:
+        bvh = MeshGetBVH(m)
+        if not bvh.nodes:
+            continue
+        active = np.flatnonzero(~hit) if anyHit else np.arange(count)
+        if not len(active):
+            break
+        mW = np.array(mW, dtype=np.float64)
+        # Into the mesh's space, the same as RayIntersectMeshMatrix()
+        origins = ((starts[active] - mW[3, :3]) @ mW[:3, :3].T) / scale
+        dirs = (directions[active] @ mW[:3, :3].T) / scale
+        inverse = 1.0 / np.where(dirs, dirs, 1e-30)
+        p, e1, e2, lows, highs, firsts, seconds, lasts = bvh.GetArrays()
+        # Going down the BVH one level at a time, for every ray at once.
+        # Each pair is a ray and a node it might go through.
+        rays = np.arange(len(active))
+        nodes = np.zeros(len(active), dtype=np.int64)
+        leafRays = []
+        leafNodes = []
+        while len(rays):
+            t1 = (lows[nodes] - origins[rays]) * inverse[rays]
+            t2 = (highs[nodes] - origins[rays]) * inverse[rays]
+            near = np.minimum(t1, t2).max(1)
+            far = np.maximum(t1, t2).min(1)
+            inside = (near <= far) & (far > 0.0) & (near < best[active[rays]])
+            rays = rays[inside]
+            nodes = nodes[inside]
+            leaf = firsts[nodes] == -1
+            leafRays.append(rays[leaf])
+            leafNodes.append(nodes[leaf])
+            rays = np.repeat(rays[~leaf], 2)
+            nodes = np.stack((firsts[nodes[~leaf]], seconds[nodes[~leaf]]), axis=1).reshape(-1)
+        rays = np.concatenate(leafRays)
+        nodes = np.concatenate(leafNodes)
+        # Then every tri in those leaves
+        sizes = lasts[nodes] - seconds[nodes]
+        rays = np.repeat(rays, sizes)
+        t = bvh.orderArray[np.repeat(seconds[nodes], sizes) + np.arange(len(rays)) - np.repeat(np.cumsum(sizes) - sizes, sizes)]
+        if not len(t):
+            continue
+        # Moller-Trumbore
+        d = dirs[rays]
+        h = np.cross(d, e2[t])
+        a = (e1[t] * h).sum(1)
+        valid = np.abs(a) > 1e-12
+        f = 1.0 / np.where(valid, a, 1.0)
+        o = origins[rays] - p[t]
+        u = (o * h).sum(1) * f
+        q = np.cross(o, e1[t])
+        v = (d * q).sum(1) * f
+        l = (e2[t] * q).sum(1) * f
+        valid &= (u > 0.0) & (u < 1.0) & (v > 0.0) & (u + v < 1.0) & (l > 0.0) & (l < best[active[rays]])
+        rays = rays[valid]
+        t = t[valid]
+        l = l[valid]
+        # The closest one for each ray
+        closest = np.lexsort((l, rays))
+        first = closest[np.unique(rays[closest], return_index=True)[1]]
+        rows = active[rays[first]]
+        best[rows] = l[first]
+        hit[rows] = True
+        tris[rows] = t[first]
+        things[rows] = thing
+        meshes[rows] = mesh
+
+    return hit, best, starts + directions * best[:, None], tris, things, meshes
+
+# SceneBVH:
+#
+# A BVH over the world-space boxes of every thing and dupe in a list of
+# layers, for casting rays at the whole world. Each thing's meshes use
+# their own BVH after that.
+#
+# Update() checks the movable things, and if any moved, only their boxes
+# and the boxes above them are fixed, the tree isn't built again. If things
+# were added or removed, it's built again.
+# Things that aren't movable are expected to stay put.
+
+# Usage:
+'''
+# Once per frame, after things have moved
+myScene = z3dpy.SceneBVH()
+myScene.Update()
+
+# Then as many rays as needed
+hit = myScene.Raycast(myRay)
+
+if hit[0]:
+    print("Hit", hit[4], "at", hit[1])
+
+# Or for the odd ray, RaycastScene() does both
+hit = z3dpy.RaycastScene(myRay)
+'''
+
+class SceneBVH():
+    def __init__(self, layerList=None):
+        self.layers = layers if layerList is None else layerList
+        self.contents = None
+        self.Update()
+
+    def __repr__(self):
+        return "Z3dPy SceneBVH:\n\tThings: " + str(len(self.entries)) + "\n\tNodes: " + str(len(self.nodes)) + "\n\t"
+
+    def Update(self):
+        contents = [id(t) for layer in self.layers for t in layer]
+        if contents != self.contents:
+            self.contents = contents
+            self.Build()
+            return
+        moved = False
+        for e in self.movable:
+            entry = self.entries[e]
+            placement = EntryPlacement(entry[0], entry[1], entry[2])
+            if placement != entry[3]:
+                entry[3] = placement
+                self.nodes[entry[4]][0], self.nodes[entry[4]][1] = EntryBox(entry[0], entry[1], entry[2])
+                moved = True
+        if moved:
+            # Children always come after their parents
+            for node in reversed(self.nodes):
+                if node[2] != -1:
+                    first = self.nodes[node[2]]
+                    second = self.nodes[node[3]]
+                    node[0] = [min(first[0][0], second[0][0]), min(first[0][1], second[0][1]), min(first[0][2], second[0][2])]
+                    node[1] = [max(first[1][0], second[1][0]), max(first[1][1], second[1][1]), max(first[1][2], second[1][2])]
+
+    def Build(self):
+        # Each entry is [thing, position, rotation, placement, leaf node]
+        self.entries = []
+        self.movable = []
+        for layer in self.layers:
+            for t in layer:
+                if type(t) is list:
+                    # Dupe
+                    thing = layer[t[0]]
+                    self.entries.append([thing, t[1], t[2], EntryPlacement(thing, t[1], t[2]), -1])
+                else:
+                    self.entries.append([t, None, None, EntryPlacement(t, None, None), -1])
+                if self.entries[-1][0].movable:
+                    self.movable.append(len(self.entries) - 1)
+        self.nodes = []
+        if self.entries:
+            boxes = [EntryBox(e[0], e[1], e[2]) for e in self.entries]
+            self.BuildNode(list(range(len(self.entries))), boxes)
+
+    def BuildNode(self, entries, boxes):
+        index = len(self.nodes)
+        self.nodes.append([[min(boxes[e][0][0] for e in entries), min(boxes[e][0][1] for e in entries), min(boxes[e][0][2] for e in entries)], [max(boxes[e][1][0] for e in entries), max(boxes[e][1][1] for e in entries), max(boxes[e][1][2] for e in entries)], -1, entries[0]])
+        if len(entries) == 1:
+            self.entries[entries[0]][4] = index
+            return index
+        size = VectorSub(self.nodes[index][1], self.nodes[index][0])
+        axis = size.index(max(size))
+        entries.sort(key=lambda e: boxes[e][0][axis] + boxes[e][1][axis])
+        middle = len(entries) // 2
+        self.nodes[index][2] = self.BuildNode(entries[:middle], boxes)
+        self.nodes[index][3] = self.BuildNode(entries[middle:], boxes)
+        return index
+
+    # Returns the closest hit in the same format as RayIntersectThingComplex(),
+    # with [4] being the thing that was hit. Invisible things are skipped.
+    # Meshes with a different id are skipped, if an id is given.
+    def Raycast(self, ray, id=None):
+        output = (False,)
+        if not self.nodes:
+            return output
+        o = ray[1]
+        d = RayGetDirection(ray)
+        inverse = [1 / d[0] if d[0] else 1e30, 1 / d[1] if d[1] else 1e30, 1 / d[2] if d[2] else 1e30]
+        best = RayGetLength(ray)
+        stack = [0]
+        while stack:
+            node = self.nodes[stack.pop()]
+            near = -1e30
+            far = 1e30
+            for a in range(3):
+                t1 = (node[0][a] - o[a]) * inverse[a]
+                t2 = (node[1][a] - o[a]) * inverse[a]
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                near = max(near, t1)
+                far = min(far, t2)
+            if near > far or far <= 0.0 or near >= best:
+                continue
+            if node[2] != -1:
+                stack.append(node[3])
+                stack.append(node[2])
+                continue
+            entry = self.entries[node[3]]
+            if not entry[0].visible:
+                continue
+            for m, mW, scale in ThingMeshMatrices(entry[0], entry[1], entry[2]):
+                if id is not None and m.id != id:
+                    continue
+                hit = RayIntersectMeshMatrix(ray, m, mW, scale)
+                if hit[0] and hit[2] < best:
+                    best = hit[2]
+                    output = hit + (entry[0],)
+        return output
+
+# What a thing's place in the world depends on, to tell if it's moved
+def EntryPlacement(thing, position, rotation):
+    position = thing.position if position is None else position
+    rotation = thing.rotation if rotation is None else rotation
+    return (tuple(position), tuple(rotation), tuple(thing.scale)) + tuple((tuple(m.position), tuple(m.rotation), tuple(m.scale), m.frame, id(m.tris)) for m in thing.meshes)
+
+# World-space box around all of a thing's meshes
+def EntryBox(thing, position, rotation):
+    lo = [1e30, 1e30, 1e30]
+    hi = [-1e30, -1e30, -1e30]
+    for m, mW, scale in ThingMeshMatrices(thing, position, rotation):
+        # The same bounds as frustum culling
+        if m.bounds is None:
+            m.UpdateBounds()
+        if m.bounds is None:
+            continue
+        bounds = BoundsTransformMatrix(m.bounds, mW, scale)
+        lo = [min(lo[a], bounds[2][a]) for a in range(3)]
+        hi = [max(hi[a], bounds[3][a]) for a in range(3)]
+    return lo, hi
+
+sceneBVH = None
+
+# Casts a ray at everything in the layers, returning the closest hit.
+# Keeps a SceneBVH around, and updates it each time.
+def RaycastScene(ray, id=None):
+    global sceneBVH
+    if sceneBVH is None:
+        sceneBVH = SceneBVH()
+    else:
+        sceneBVH.Update()
+    return sceneBVH.Raycast(ray, id)
 
 def TriToRays(tri):
     return [Ray(tri[0], tri[1]), Ray(tri[1], tri[2]), Ray(tri[2], tri[0])]
@@ -2338,10 +3347,198 @@ def TrainInterpolate(train, fX, fY):
 #
 #==========================================================================
 
+# Mesh Collisions
+#
+# A HITBOX_MESH hitbox collides with the thing's own meshes instead of a
+# sphere or box, so level geometry doesn't have to be built out of lots of
+# boxes. Spheres and boxes can hit it, but not other meshes.
+#
+# The hitbox's radius is still used by the broadphase, so it has to cover
+# all the meshes, MeshHitbox() works it out.
+#
+# HitboxMeshContact() gives the normal pointing out of the mesh and how far
+# the hitbox is inside it, for the tri it's deepest in, or None.
+# Each mesh's BVH picks out the tris near the hitbox, see MeshGetBVH().
+
+# Usage:
+'''
+level = z3dpy.Thing([z3dpy.LoadMesh("mesh/level.obj")], movable=False)
+level.hitbox = z3dpy.MeshHitbox(level)
+
+contact = z3dpy.HitboxMeshContact(myCharacter, level)
+if contact is not None:
+    normal = contact[0]
+    depth = contact[1]
+'''
+
+def MeshHitbox(thing, id=0):
+    for m in thing.meshes:
+        if m.bounds is None:
+            m.UpdateBounds()
+    bounds = thing.GetBounds()
+    radius = DistanceBetweenVectors(thing.position, bounds[0]) + bounds[1] if bounds else 0
+    return Hitbox(HITBOX_MESH, id, radius, radius)
+
+# Each world-space tri of the thing's meshes that might touch the box
+# around centre, size is half the width on each axis.
+def MeshTrisNear(thing, centre, size):
+    for m, mW, scale in ThingMeshMatrices(thing):
+        bvh = MeshGetBVH(m)
+        # Into the mesh's space, the matrix only rotates so it's inverse is
+        # it's transpose
+        o = VectorSub(centre, mW[3])
+        lo = []
+        hi = []
+        for a in range(3):
+            c = DotProduct(o, mW[a][:3]) / scale[a]
+            e = (abs(mW[a][0]) * size[0] + abs(mW[a][1]) * size[1] + abs(mW[a][2]) * size[2]) / abs(scale[a])
+            lo.append(c - e)
+            hi.append(c + e)
+        for t in bvh.BoxQuery(lo, hi):
+            tri = bvh.tris[t]
+            yield Vec3MatrixMul(VectorMul(tri[0], scale), mW), Vec3MatrixMul(VectorMul(tri[1], scale), mW), Vec3MatrixMul(VectorMul(tri[2], scale), mW)
+
+def ClosestPointOnTri(p, a, b, c):
+    ab = VectorSub(b, a)
+    ac = VectorSub(c, a)
+    ap = VectorSub(p, a)
+    d1 = DotProduct(ab, ap)
+    d2 = DotProduct(ac, ap)
+    if d1 <= 0 and d2 <= 0:
+        return a
+    bp = VectorSub(p, b)
+    d3 = DotProduct(ab, bp)
+    d4 = DotProduct(ac, bp)
+    if d3 >= 0 and d4 <= d3:
+        return b
+    vc = d1 * d4 - d3 * d2
+    if vc <= 0 and d1 >= 0 and d3 <= 0:
+        return VectorAdd(a, VectorMulF(ab, d1 / (d1 - d3)))
+    cp = VectorSub(p, c)
+    d5 = DotProduct(ab, cp)
+    d6 = DotProduct(ac, cp)
+    if d6 >= 0 and d5 <= d6:
+        return c
+    vb = d5 * d2 - d1 * d6
+    if vb <= 0 and d2 >= 0 and d6 <= 0:
+        return VectorAdd(a, VectorMulF(ac, d2 / (d2 - d6)))
+    va = d3 * d6 - d5 * d4
+    if va <= 0 and d4 - d3 >= 0 and d5 - d6 >= 0:
+        return VectorAdd(b, VectorMulF(VectorSub(c, b), (d4 - d3) / ((d4 - d3) + (d5 - d6))))
+    denom = 1 / (va + vb + vc)
+    return VectorAdd(a, VectorAdd(VectorMulF(ab, vb * denom), VectorMulF(ac, vc * denom)))
+
+def SphereMeshContact(centre, radius, thing):
+    best = None
+    for a, b, c in MeshTrisNear(thing, centre, (radius, radius, radius)):
+        closest = ClosestPointOnTri(centre, a, b, c)
+        out = VectorSub(centre, closest)
+        dist = VectorGetLength(out)
+        if dist < radius and (best is None or radius - dist > best[1]):
+            if dist:
+                best = (VectorDivF(out, dist), radius - dist)
+            else:
+                # Right on the tri, push out the front
+                best = (VectorNormalize(CrossProduct(VectorSub(b, a), VectorSub(c, a))), radius)
+    return best
+
+# Separating axis test between a box lined up with the world, and a tri.
+# Returns the axis the box comes out of the tri the shortest way, and how
+# far, or None if they don't touch.
+def BoxTriContact(centre, size, a, b, c):
+    v0 = VectorSub(a, centre)
+    v1 = VectorSub(b, centre)
+    v2 = VectorSub(c, centre)
+    edges = (VectorSub(v1, v0), VectorSub(v2, v1), VectorSub(v0, v2))
+    axes = [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0), CrossProduct(edges[0], edges[1])]
+    for e in edges:
+        axes += [(0.0, -e[2], e[1]), (e[2], 0.0, -e[0]), (-e[1], e[0], 0.0)]
+    best = None
+    for axis in axes:
+        length = DotProduct(axis, axis)
+        if length < 1e-12:
+            continue
+        length = sqrt(length)
+        p0 = DotProduct(v0, axis)
+        p1 = DotProduct(v1, axis)
+        p2 = DotProduct(v2, axis)
+        r = size[0] * abs(axis[0]) + size[1] * abs(axis[1]) + size[2] * abs(axis[2])
+        lo = min(p0, p1, p2)
+        hi = max(p0, p1, p2)
+        if lo > r or hi < -r:
+            return None
+        # Pushing the box along the axis, or against it
+        if hi + r < r - lo:
+            depth = (hi + r) / length
+            sign = 1 / length
+        else:
+            depth = (r - lo) / length
+            sign = -1 / length
+        if best is None or depth < best[1]:
+            best = (VectorMulF(axis, sign), depth)
+    return best
+
+def BoxMeshContact(centre, size, thing):
+    best = None
+    for a, b, c in MeshTrisNear(thing, centre, size):
+        contact = BoxTriContact(centre, size, a, b, c)
+        if contact is not None and (best is None or contact[1] > best[1]):
+            best = contact
+    return best
+
+def HitboxMeshContact(thing, meshThing):
+    match thing.hitbox.type:
+        case 2:
+            return BoxMeshContact(thing.position, (thing.hitbox.radius, thing.hitbox.height, thing.hitbox.radius), meshThing)
+        case 3:
+            return None
+    return SphereMeshContact(thing.position, thing.hitbox.radius, meshThing)
+
+# HitboxesOverlap()
+# The narrowphase used by GatherCollisions(): tests thing1's hitbox type
+# against thing2, once the broadphase has found them close enough.
+# Mesh hitboxes are tested with HitboxMeshContact().
+
+# Usage:
+'''
+if z3dpy.HitboxesOverlap(myCharacter, thatTree):
+    print("Ouch")
+'''
+
+def HitboxesOverlap(thing1, thing2):
+    if thing2.hitbox.type == HITBOX_MESH:
+        return HitboxMeshContact(thing1, thing2) is not None
+    if thing1.hitbox.type == HITBOX_MESH:
+        return HitboxMeshContact(thing2, thing1) is not None
+    myPos = thing1.position
+    thPos = thing2.position
+    match thing1.hitbox.type:
+        case 0:
+            # Sphere
+            # If the distance is within range, it's a hit.
+            return DistanceBetweenVectors(myPos, thPos) < thing2.hitbox.radius
+        case 2:
+            # Cube
+            # Just a bunch of range checks
+            rad = thing1.hitbox.radius + thing2.hitbox.radius
+            hgt = thing1.hitbox.height + thing2.hitbox.height
+            return abs(myPos[0] - thPos[0]) <= rad and abs(myPos[1] - thPos[1]) <= hgt and abs(myPos[2] - thPos[2]) <= rad
+    return False
+
 # GatherCollisions()
 # Returns a list of lists, containing the two things that are colliding.
 # Makes sure that there are no repeats in the list.
 
+# Things are sorted into a spatial hash per hitbox id, with cells as wide as
+# the biggest hitbox in that id, so each thing only checks the 27 cells around
+# it instead of the whole list. Mesh hitboxes are checked against everything
+# in their id instead.
+
+# With skipSleeping, sleeping bodies are only checked against things that
+# are awake, since nothing can change between them and things that don't
+# move. PhysicsCollisions() uses it, but it's off by default, so triggers
+# and pickups still see sleeping bodies.
+
 # Usage:
 '''
 myCharacter.hitbox = z3dpy.Hitbox()
@@ -2354,36 +3551,224 @@ for collision in GatherCollisions([myCharacter, thatTree, david]):
 
 '''
 
-def GatherCollisions(thingList):
-    results = []
+# Spatial hash of the things in bucket, which are indices into thingList.
+# GatherCollisions() leaves mesh hitboxes out of it.
+# Two hitboxes only get past the distance check if they are closer than their
+# radii combined, so with cells 2 * the biggest radius wide, any pair is in
+# neighbouring cells.
+# Returns the cell size, the grid, and the cell of each thing in bucket.
+def HitboxGrid(thingList, bucket):
+    cellSize = 2 * max(thingList[me].hitbox.radius for me in bucket)
+    grid = {}
+    cells = []
+    if cellSize <= 0:
+        return cellSize, grid, cells
+    for me in bucket:
+        pos = thingList[me].position
+        cell = (int(pos[0] // cellSize), int(pos[1] // cellSize), int(pos[2] // cellSize))
+        grid.setdefault(cell, []).append(me)
+        cells.append(cell)
+    return cellSize, grid, cells
+
+def GatherCollisions(thingList, skipSleeping=False):
+    # Bucket by hitbox id, since only matching ids can collide.
+    buckets = {}
+    # 0 moves, 1 doesn't, 2 is asleep
+    quiet = [0] * len(thingList)
     for me in range(len(thingList)):
-        if thingList[me].hitbox:
-            for thm in ListExclude(thingList, me):
-                if thm.hitbox:
-                    if thm.hitbox.id == thingList[me].hitbox.id:
-                        if DistanceBetweenVectors(thm.position, thingList[me].position) < thm.hitbox.radius + thingList[me].hitbox.radius:
-                            if [thm, thingList[me]] not in results:
-
-                                myPos = thingList[me].position
-                                thPos = thm.position
-                                match thingList[me].hitbox.type:
-                                    case 0:
-                                        # Sphere
-                                        # If the distance is within range, it's a hit.
-                                        distance = DistanceBetweenVectors(myPos, thPos)
-                                        if distance < thm.hitbox.radius:
-                                            results.append([thingList[me], thm])
-                                    case 2:
-                                        # Cube
-                                        # Just a bunch of range checks
-                                        rad = thingList[me].hitbox.radius + thm.hitbox.radius
-                                        hgt = thingList[me].hitbox.height + thm.hitbox.height
-                                        if abs(myPos[0] - thPos[0]) <= rad:
-                                            if abs(myPos[1] - thPos[1]) <= hgt:
-                                                if abs(myPos[2] - thPos[2]) <= rad:
-                                                    results.append([thingList[me], thm])
+        thing = thingList[me]
+        if thing.hitbox:
+            buckets.setdefault(thing.hitbox.id, []).append(me)
+            if skipSleeping:
+                quiet[me] = 2 if BodyAsleep(thing) else 0 if thing.physics and thing.movable else 1
+
+    candidates = {}
+    for bucket in buckets.values():
+        # Mesh hitboxes are usually as big as the level, and would make the
+        # cells so big that everything is in a few of them, so they're
+        # checked against the whole bucket instead.
+        meshes = [me for me in bucket if thingList[me].hitbox.type == HITBOX_MESH]
+        rest = [me for me in bucket if thingList[me].hitbox.type != HITBOX_MESH] if meshes else bucket
+        cellSize, grid, cells = HitboxGrid(thingList, rest) if rest else (0, {}, [])
+        for me, cell in zip(rest if cellSize > 0 else (), cells):
+            thing = thingList[me]
+            found = []
+            for x in range(cell[0] - 1, cell[0] + 2):
+                for y in range(cell[1] - 1, cell[1] + 2):
+                    for z in range(cell[2] - 1, cell[2] + 2):
+                        for thm in grid.get((x, y, z), ()):
+                            if thm != me and not (quiet[me] and quiet[thm] and quiet[me] + quiet[thm] > 2):
+                                th = thingList[thm]
+                                if DistanceBetweenVectors(th.position, thing.position) < th.hitbox.radius + thing.hitbox.radius:
+                                    found.append(thm)
+            if found:
+                candidates[me] = found
+
+        for me in meshes:
+            thing = thingList[me]
+            for thm in bucket:
+                if thm != me and not (quiet[me] and quiet[thm] and quiet[me] + quiet[thm] > 2):
+                    th = thingList[thm]
+                    if DistanceBetweenVectors(th.position, thing.position) < th.hitbox.radius + thing.hitbox.radius:
+                        candidates.setdefault(me, []).append(thm)
+                        # Other meshes add the pair themselves
+                        if th.hitbox.type != HITBOX_MESH:
+                            candidates.setdefault(thm, []).append(me)
+
+    # Keep list order, so results come out the same as checking every pair.
+    for found in candidates.values():
+        found.sort()
+
+    results = []
+    seen = set()
+    for me in sorted(candidates):
+        thing = thingList[me]
+        for thm in candidates[me]:
+            th = thingList[thm]
+            if (id(th), id(thing)) not in seen:
+                if HitboxesOverlap(thing, th):
+                    results.append([thing, th])
+                    seen.add((id(thing), id(th)))
     return results
 
+# CollisionWorld:
+#
+# Keeps track of hitboxes between frames, so instead of just the pairs
+# that are colliding, Update() tells you which pairs began colliding, which
+# are still colliding, and which stopped.
+#
+# Each hitbox is an interval on the x, y and z axes, kept in a sorted list
+# per axis. Things don't move far in a frame, so the lists are nearly sorted
+# already and re-sorting them is close to linear. Update() sweeps the axis
+# the things are most spread out on, and only pairs that overlap on all 3
+# axes get the same checks as GatherCollisions().
+#
+# Pairs come out the same way as GatherCollisions(), in the order the things
+# were added. A thing that's removed ends all its pairs on the next Update().
+
+# Usage:
+'''
+myWorld = z3dpy.CollisionWorld()
+myWorld.Add(myCharacter)
+myWorld.Add(thatTree)
+
+# Then during the draw loop...
+
+        began, stayed, ended = myWorld.Update()
+
+        for collision in began:
+            print(collision[0], "bumped into", collision[1])
+'''
+
+class CollisionWorld():
+    def __init__(self):
+        # Each entry is [thing, serial, mins, maxs], where mins and maxs
+        # are the endpoints for each axis.
+        # Each endpoint is [value, 1 if min else 0, entry], so when two are
+        # equal the max comes first, and touching isn't overlapping.
+        self.entries = {}
+        self.axes = ([], [], [])
+        self.serial = 0
+        self.colliding = {}
+        self.collisions = []
+
+    def __repr__(self):
+        return "Z3dPy CollisionWorld:\n\tThings: " + str(len(self.entries)) + "\n\tColliding: " + str(len(self.colliding)) + "\n\t"
+
+    def GetClass(self):
+        return "CollisionWorld"
+
+    def Add(self, thing):
+        if id(thing) in self.entries:
+            return
+        entry = [thing, self.serial, [], []]
+        self.serial += 1
+        for a in range(3):
+            mn = [0.0, 1, entry]
+            mx = [0.0, 0, entry]
+            entry[2].append(mn)
+            entry[3].append(mx)
+            self.axes[a].append(mn)
+            self.axes[a].append(mx)
+        self.entries[id(thing)] = entry
+
+    def Remove(self, thing):
+        entry = self.entries.pop(id(thing), None)
+        if entry is None:
+            return
+        for a in range(3):
+            self.axes[a][:] = [ep for ep in self.axes[a] if ep[2] is not entry]
+
+    def Update(self):
+        spread = [0.0, 0.0, 0.0]
+        total = [0.0, 0.0, 0.0]
+        for entry in self.entries.values():
+            thing = entry[0]
+            if thing.hitbox:
+                rad = thing.hitbox.radius
+                for a in range(3):
+                    p = thing.position[a]
+                    entry[2][a][0] = p - rad
+                    entry[3][a][0] = p + rad
+                    total[a] += p
+                    spread[a] += p * p
+            else:
+                # Off at infinity, never overlapping anything.
+                for a in range(3):
+                    entry[2][a][0] = inf
+                    entry[3][a][0] = inf
+
+        for a in range(3):
+            self.axes[a].sort(key=itemgetter(0, 1))
+
+        # Sweep the axis with the most variance, it has the fewest overlaps.
+        count = max(len(self.entries), 1)
+        spread = [spread[a] - total[a] * total[a] / count for a in range(3)]
+        axis = spread.index(max(spread))
+        other1 = (axis + 1) % 3
+        other2 = (axis + 2) % 3
+
+        colliding = {}
+        opened = {}
+        for ep in self.axes[axis]:
+            entry = ep[2]
+            if not ep[1]:
+                opened.pop(entry[1], None)
+                continue
+            if entry[2][0][0] == inf:
+                continue
+            thing = entry[0]
+            for other in opened.values():
+                if other[2][other1][0] < entry[3][other1][0] and entry[2][other1][0] < other[3][other1][0]:
+                    if other[2][other2][0] < entry[3][other2][0] and entry[2][other2][0] < other[3][other2][0]:
+                        th = other[0]
+                        if th.hitbox.id == thing.hitbox.id:
+                            if DistanceBetweenVectors(th.position, thing.position) < th.hitbox.radius + thing.hitbox.radius:
+                                # Same order as GatherCollisions(), the one added first goes first.
+                                if other[1] < entry[1]:
+                                    first, second = other, entry
+                                else:
+                                    first, second = entry, other
+                                key = (first[1], second[1])
+                                if HitboxesOverlap(first[0], second[0]):
+                                    colliding[key] = [first[0], second[0]]
+                                elif HitboxesOverlap(second[0], first[0]):
+                                    colliding[key] = [second[0], first[0]]
+            opened[entry[1]] = entry
+
+        began = []
+        stayed = []
+        for key in sorted(colliding):
+            if key in self.colliding:
+                stayed.append(colliding[key])
+            else:
+                began.append(colliding[key])
+        ended = [self.colliding[key] for key in sorted(self.colliding) if key not in colliding]
+
+        self.colliding = colliding
+        self.collisions = began + stayed
+        return began, stayed, ended
+
 # BasicHandleCollisions()
 # Takes 2 things: the other, and the pivot. The other will get manually placed outside of the pivot's hitbox.
 
@@ -2401,6 +3786,26 @@ for collision in GatherCollisions([myCharacter, thatTree, david]):
 '''
 
 def BasicHandleCollisions(other, pivot):
+    if HITBOX_MESH in (other.hitbox.type, pivot.hitbox.type):
+        # Mesh Collisions
+        # Out of the mesh along the contact normal
+        if pivot.hitbox.type == HITBOX_MESH:
+            contact = HitboxMeshContact(other, pivot)
+            if contact is None:
+                return
+            normal = contact[0]
+        else:
+            contact = HitboxMeshContact(pivot, other)
+            if contact is None:
+                return
+            normal = VectorMulF(contact[0], -1)
+        other.position = VectorAdd(other.position, VectorMulF(normal, contact[1]))
+        if other.physics:
+            into = DotProduct(other.physics.velocity, normal)
+            if into < 0:
+                other.physics.velocity = VectorSub(other.physics.velocity, VectorMulF(normal, into))
+        return
+
     match other.hitbox.type:
         case 0:
             # Sphere Collisions
@@ -2457,7 +3862,9 @@ while True:
 '''
 
 def HandlePhysics(thing, floorHeight=0):
-    if thing.movable and thing.physics:
+    if thing.movable and thing.physics and not BodyAsleep(thing):
+        if thing.physics.ccd:
+            thing.physics.previousPosition = thing.position
         thing.physics.velocity = VectorAdd(thing.physics.velocity, thing.physics.acceleration)
         # Drag
         thing.physics.velocity = VectorSub(thing.physics.velocity, [airDrag * Sign(thing.physics.velocity[0]), airDrag * Sign(thing.physics.velocity[1]), airDrag * Sign(thing.physics.velocity[2])])
@@ -2503,6 +3910,414 @@ def GroundBounce(thing):
         return
     thing.physics.velocity[1] = newVel
 
+# Sleeping
+#
+# BodyAsleep() is True if a thing's physics body is asleep. If its position,
+# rotation, velocity, rotational velocity, or acceleration changed since it
+# fell asleep, it wakes up first, along with the rest of its island.
+#
+# SleepIslands() is done at the end of PhysicsCollisions(). Bodies touching
+# each other are one island, found with a union-find over the collisions,
+# and an island only falls asleep once every body in it has been still for
+# sleepTime. Touching a sleeping body wakes its whole island.
+
+# Usage:
+'''
+# To wake something up manually
+z3dpy.WakeBody(myCharacter)
+
+# To turn it off
+z3dpy.physicsSleeping = False
+'''
+
+def BodyAsleep(thing):
+    body = thing.physics
+    if not body or not body.asleep:
+        return False
+    state = body.sleepState
+    if list(thing.position) != state[0] or list(body.velocity) != state[1] or list(body.acceleration) != state[2] or list(thing.rotation) != state[3] or list(body.rotVelocity) != state[4]:
+        WakeBody(thing)
+        return False
+    return True
+
+def WakeBody(thing):
+    for t in thing.physics.island or [thing]:
+        t.physics.asleep = False
+        t.physics.sleepTimer = 0.0
+        t.physics.island = None
+
+def SleepBody(thing, island):
+    body = thing.physics
+    body.asleep = True
+    body.velocity = [0, 0, 0]
+    body.rotVelocity = [0, 0, 0]
+    body.sleepState = (list(thing.position), [0, 0, 0], list(body.acceleration), list(thing.rotation), [0, 0, 0])
+    body.island = island
+
+def IslandFind(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def SleepIslands(thingList, collisions):
+    if not physicsSleeping:
+        return
+    # Anything awake touching a sleeping body wakes it
+    for cols in collisions:
+        if cols[0].physics and cols[1].physics and cols[0].movable and cols[1].movable:
+            if cols[0].physics.asleep != cols[1].physics.asleep:
+                WakeBody(cols[0] if cols[0].physics.asleep else cols[1])
+
+    parent = {}
+    bodies = []
+    for t in thingList:
+        if type(t) is not list and t.movable and t.physics and not t.physics.asleep:
+            if id(t) in parent:
+                continue
+            parent[id(t)] = id(t)
+            bodies.append(t)
+            body = t.physics
+            last = body.lastPosition
+            body.lastPosition = list(t.position)
+            rv = body.rotVelocity
+            if last is None or DistanceBetweenVectors(t.position, last) > sleepVelocity * delta or max(abs(rv[0]), abs(rv[1]), abs(rv[2])) > sleepVelocity:
+                body.sleepTimer = 0.0
+            else:
+                body.sleepTimer += delta
+
+    for cols in collisions:
+        a = id(cols[0])
+        b = id(cols[1])
+        if a in parent and b in parent:
+            parent[IslandFind(parent, a)] = IslandFind(parent, b)
+
+    islands = {}
+    for t in bodies:
+        islands.setdefault(IslandFind(parent, id(t)), []).append(t)
+    for island in islands.values():
+        if all(t.physics.sleepTimer >= sleepTime for t in island):
+            for t in island:
+                SleepBody(t, island)
+
+# Continuous Collisions
+#
+# Fast things can go right through a thin hitbox in one step, because only
+# where they end up is checked. Setting ccd on a physics body has
+# HandlePhysics() remember where it started, and PhysicsCollisions() sweeps
+# its hitbox from there to where it ended up, against the other hitboxes
+# with the same id.
+#
+# SweptHitboxes() gives the time of impact, from 0 at the start to 1 at the
+# end, and the normal of the surface that was hit, or None if it missed.
+# Spheres are swept against a sphere the size of the other thing's radius,
+# boxes against a box of both sizes combined, the same ranges as
+# HitboxesOverlap(), and the other thing is treated as standing still.
+# Things that already overlap at the start are left to the usual collisions.
+#
+# SweepCollisions() uses up where each body started, so running it again
+# without a physics step, or after moving the thing, doesn't sweep it from
+# there a second time.
+# Against a mesh hitbox, the centre is swept as a ray and stopped the radius
+# short of the tri it hits.
+
+# Usage:
+'''
+bullet.physics = z3dpy.PhysicsBody()
+bullet.physics.ccd = True
+
+# PhysicsCollisions() clamps it automatically, or by hand:
+for hit in z3dpy.SweepCollisions([bullet, thinWall]):
+    thing = hit[0]
+    other = hit[1]
+    toi = hit[2]
+    normal = hit[3]
+    start = hit[4]
+    z3dpy.ClampSweep(hit)
+'''
+
+def SweptHitboxes(thing1, start, end, thing2):
+    centre = thing2.position
+    d = VectorSub(end, start)
+    if thing2.hitbox.type == HITBOX_MESH:
+        # Roughly, the centre as a ray against the tris, stopped short by
+        # the radius
+        length = VectorGetLength(d)
+        if not length or thing1.hitbox.type == HITBOX_MESH:
+            return None
+        best = (False,)
+        for m, mW, scale in ThingMeshMatrices(thing2):
+            hit = RayIntersectMeshMatrix(Ray(start, end), m, mW, scale)
+            if hit[0] and (not best[0] or hit[2] < best[2]):
+                best = hit
+        if not best[0]:
+            return None
+        tri = best[3]
+        normal = VectorNormalize(CrossProduct(VectorSub(tri[1], tri[0]), VectorSub(tri[2], tri[0])))
+        if DotProduct(normal, d) > 0:
+            normal = VectorMulF(normal, -1)
+        return max(best[2] - thing1.hitbox.radius, 0.0) / length, normal
+    if thing1.hitbox.type == HITBOX_MESH:
+        return None
+    match thing1.hitbox.type:
+        case 0:
+            # Sphere
+            rad = thing2.hitbox.radius
+            f = VectorSub(start, centre)
+            c = DotProduct(f, f) - rad * rad
+            if c <= 0:
+                return None
+            a = DotProduct(d, d)
+            b = 2 * DotProduct(f, d)
+            disc = b * b - 4 * a * c
+            if a == 0 or disc < 0:
+                return None
+            toi = (-b - sqrt(disc)) / (2 * a)
+            if toi < 0 or toi > 1:
+                return None
+            return toi, VectorDivF(VectorAdd(f, VectorMulF(d, toi)), rad)
+        case 2:
+            # Box, slab test against both boxes combined
+            rad = thing1.hitbox.radius + thing2.hitbox.radius
+            size = (rad, thing1.hitbox.height + thing2.hitbox.height, rad)
+            tEnter = -inf
+            tExit = inf
+            axis = -1
+            for a in range(3):
+                if d[a] == 0:
+                    if abs(start[a] - centre[a]) > size[a]:
+                        return None
+                    continue
+                t1 = (centre[a] - size[a] - start[a]) / d[a]
+                t2 = (centre[a] + size[a] - start[a]) / d[a]
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                if t1 > tEnter:
+                    tEnter = t1
+                    axis = a
+                tExit = min(tExit, t2)
+            if axis == -1 or tEnter < 0 or tEnter > 1 or tEnter > tExit:
+                return None
+            normal = [0.0, 0.0, 0.0]
+            normal[axis] = -1.0 if d[axis] > 0 else 1.0
+            return tEnter, normal
+    return None
+
+# Returns a list of [thing, other, time of impact, normal, start] for each
+# ccd body that hit something, the earliest hit for each.
+def SweepCollisions(thingList):
+    movers = [me for me in range(len(thingList)) if thingList[me].hitbox and thingList[me].physics and thingList[me].physics.ccd and thingList[me].physics.previousPosition is not None and thingList[me].movable and not thingList[me].physics.asleep]
+    if not movers:
+        return []
+    buckets = {}
+    for me in range(len(thingList)):
+        if thingList[me].hitbox:
+            buckets.setdefault(thingList[me].hitbox.id, []).append(me)
+    grids = {}
+    results = []
+    for me in movers:
+        thing = thingList[me]
+        start = thing.physics.previousPosition
+        end = thing.position
+        if thing.hitbox.id not in grids:
+            # Mesh hitboxes stay out of the grid, same as GatherCollisions(),
+            # and every sweep is checked against them.
+            bucket = buckets[thing.hitbox.id]
+            meshes = [thm for thm in bucket if thingList[thm].hitbox.type == HITBOX_MESH]
+            rest = [thm for thm in bucket if thingList[thm].hitbox.type != HITBOX_MESH] if meshes else bucket
+            grids[thing.hitbox.id] = (meshes, rest) + (HitboxGrid(thingList, rest) if rest else (0, {}, []))
+        meshes, rest, cellSize, grid, cells = grids[thing.hitbox.id]
+        # Every cell the sweep passes through, and the ones around it. If
+        # that's more cells than things, it's quicker to check them all.
+        # A mesh mover is as big as it is, so it checks them all too.
+        if cellSize > 0:
+            lo = [int(min(start[a], end[a]) // cellSize) - 1 for a in range(3)]
+            hi = [int(max(start[a], end[a]) // cellSize) + 1 for a in range(3)]
+            count = (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1)
+        if cellSize <= 0 or count > len(rest) or thing.hitbox.type == HITBOX_MESH:
+            found = rest + meshes
+        else:
+            found = list(meshes)
+            for x in range(lo[0], hi[0] + 1):
+                for y in range(lo[1], hi[1] + 1):
+                    for z in range(lo[2], hi[2] + 1):
+                        found += grid.get((x, y, z), ())
+        best = None
+        for thm in found:
+            if thm != me:
+                hit = SweptHitboxes(thing, start, end, thingList[thm])
+                if hit is not None and (best is None or hit[0] < best[2] or (hit[0] == best[2] and thm < best[5])):
+                    best = [thing, thingList[thm], hit[0], hit[1], start, thm]
+        if best:
+            results.append(best[:5])
+    for me in movers:
+        thingList[me].physics.previousPosition = None
+    return results
+
+# Moves a thing back to where the sweep hit, and stops it moving into the
+# surface.
+def ClampSweep(hit):
+    thing = hit[0]
+    body = thing.physics
+    start = hit[4]
+    thing.position = VectorAdd(start, VectorMulF(VectorSub(thing.position, start), hit[2]))
+    into = DotProduct(body.velocity, hit[3])
+    if into < 0:
+        body.velocity = VectorSub(body.velocity, VectorMulF(hit[3], into))
+
+# PhysicsSystem:
+#
+# HandlePhysics() for a whole list of things at once. The physics bodies
+# are copied into NumPy arrays, one row per thing, and Step() moves all of
+# them in one go, with the same drag, gravity, and floor bouncing.
+#
+# Step() only changes the arrays, Push() copies them back to the things,
+# and Pull() copies the things into the arrays, for when something else
+# has changed them, like PhysicsCollisions().
+# Things that aren't movable are skipped, same as HandlePhysics(), and so
+# are sleeping bodies, as of the last Pull().
+
+# Usage:
+'''
+myCharacter.physics = z3dpy.PhysicsBody()
+joe.physics = z3dpy.PhysicsBody()
+
+mySystem = z3dpy.PhysicsSystem([myCharacter, joe])
+
+# Then during the draw loop...
+
+        z3dpy.GetDelta()
+
+        mySystem.Step()
+
+        # For a train, instead of a flat floor
+        mySystem.Step(train=myTrain)
+
+        mySystem.Push()
+
+        z3dpy.PhysicsCollisions([myCharacter, thatTree, joe])
+
+        mySystem.Pull()
+'''
+
+class PhysicsSystem():
+    def __init__(self, things=None):
+        if np is None:
+            raise ImportError("PhysicsSystem needs NumPy")
+        self.things = []
+        self.trainArray = None
+        if things:
+            for t in things:
+                if t.physics:
+                    self.things.append(t)
+        self.Pull()
+
+    def __repr__(self):
+        return "Z3dPy PhysicsSystem:\n\tBodies: " + str(len(self.things)) + "\n\t"
+
+    def GetClass(self):
+        return "PhysicsSystem"
+
+    def Add(self, thing):
+        if thing.physics and thing not in self.things:
+            self.things.append(thing)
+            self.Pull()
+
+    def Remove(self, thing):
+        if thing in self.things:
+            self.things.remove(thing)
+            self.Pull()
+
+    # Copies the things into the arrays
+    def Pull(self):
+        things = self.things
+        count = len(things)
+        self.position = np.array([t.position for t in things], dtype=float).reshape(count, 3)
+        self.rotation = np.array([t.rotation for t in things], dtype=float).reshape(count, 3)
+        self.velocity = np.array([t.physics.velocity for t in things], dtype=float).reshape(count, 3)
+        self.acceleration = np.array([t.physics.acceleration for t in things], dtype=float).reshape(count, 3)
+        self.rotVelocity = np.array([t.physics.rotVelocity for t in things], dtype=float).reshape(count, 3)
+        self.mass = np.array([t.physics.mass for t in things], dtype=float)
+        self.bounciness = np.array([t.physics.bounciness for t in things], dtype=float)
+        self.halfHeight = np.array([t.hitbox.height * 0.5 if t.hitbox else 0.0 for t in things], dtype=float)
+        self.movable = np.array([bool(t.movable) for t in things], dtype=bool)
+        self.previousPosition = self.position.copy()
+        self.asleep = np.array([BodyAsleep(t) for t in things], dtype=bool)
+
+    # Copies the arrays back to the things
+    def Push(self):
+        position = self.position.tolist()
+        rotation = self.rotation.tolist()
+        velocity = self.velocity.tolist()
+        rotVelocity = self.rotVelocity.tolist()
+        previous = self.previousPosition.tolist()
+        for i, t in enumerate(self.things):
+            t.position = position[i]
+            t.rotation = rotation[i]
+            t.physics.velocity = velocity[i]
+            t.physics.rotVelocity = rotVelocity[i]
+            if t.physics.ccd:
+                t.physics.previousPosition = previous[i]
+
+    def Step(self, floorHeight=0, train=None):
+        m = self.movable & ~self.asleep
+        if not m.any():
+            return
+        # The floor comes from where things were before moving, same as
+        # HandlePhysicsTrain()
+        floors = np.full(int(m.sum()), float(floorHeight))
+        if train is not None:
+            floors = self.TrainHeights(train, self.position[m], floors)
+
+        self.previousPosition = self.position.copy()
+        vel = self.velocity[m] + self.acceleration[m]
+        # Drag
+        vel -= airDrag * np.sign(vel)
+        rotVel = self.rotVelocity[m]
+        rotVel -= airDrag * np.sign(rotVel)
+
+        # Gravity
+        vel += np.multiply(gravity, 5.0 * delta)
+
+        # Applying Velocities
+        pos = self.position[m] + vel * delta
+        self.rotation[m] += rotVel * delta
+
+        flr = floors - self.halfHeight[m]
+
+        landed = pos[:, 1] >= flr
+        pos[landed, 1] = flr[landed]
+        # GroundBounce() for the fast ones, the rest stop
+        bounce = landed & (vel[:, 1] > 6)
+        newVel = vel[:, 1] * -self.bounciness[m]
+        newVel[np.abs(newVel) < 0.001] = 0.0
+        vel[bounce, 1] = newVel[bounce]
+        vel[landed & ~bounce, 1] = 0.0
+
+        self.position[m] = pos
+        self.velocity[m] = vel
+        self.rotVelocity[m] = rotVel
+
+    # TrainInterpolate() for every body inside the train, the rest keep floor
+    def TrainHeights(self, train, pos, floors):
+        if self.trainArray is None or self.trainArray[0] is not train:
+            self.trainArray = (train, np.array(train, dtype=float))
+        heights = self.trainArray[1]
+        x = pos[:, 0]
+        z = pos[:, 2]
+        inside = (x > 0.0) & (x < heights.shape[0] - 1) & (z > 0.0) & (z < heights.shape[1] - 1)
+        x = x[inside]
+        z = z[inside]
+        x0 = np.floor(x).astype(int)
+        x1 = np.ceil(x).astype(int)
+        z0 = np.floor(z).astype(int)
+        z1 = np.ceil(z).astype(int)
+        fz = z - z0
+        first = (heights[x0, z1] - heights[x0, z0]) * fz + heights[x0, z0]
+        second = (heights[x1, z1] - heights[x1, z0]) * fz + heights[x1, z0]
+        floors[inside] = (second - first) * (x - x0) + first
+        return floors
+
 # PhysicsCollisions()
 # Does GatherCollisions() and BasicHandleCollisions() automatically, with some
 # velocity manipulation when a physics body is involved.
@@ -2530,7 +4345,10 @@ thatOtherTree.hitbox = z3dpy.Hitbox()
 '''
 
 def PhysicsCollisions(thing_list):
-    for cols in GatherCollisions(thing_list):
+    for hit in SweepCollisions(thing_list):
+        ClampSweep(hit)
+    collisions = GatherCollisions(thing_list, True)
+    for cols in collisions:
         if cols[0].physics:
             if cols[1].physics:
                 # Start with a BasicHandleCollisions(), the pivot is the Thing with higher velocity
@@ -2552,10 +4370,102 @@ def PhysicsCollisions(thing_list):
         else:
             BasicHandleCollisions(cols[1], cols[0])
 
+    SleepIslands(thing_list, collisions)
+
 def Sign(f):
     return 0 if f == 0 else 1 if f > 0 else -1
 
 
+# PhysicsScheduler:
+#
+# Runs the physics at a fixed rate instead of once per frame with delta,
+# so a slow frame means more steps, not one big one that things can tunnel
+# through, and the same inputs give the same results.
+#
+# Each step does HandlePhysics(), PhysicsCollisions() and HandleEmitters(),
+# with delta set to the step length, then calls onStep() if there is one.
+# A frame only catches up maxSteps steps, the rest of the time is dropped,
+# so a long stall slows things down instead of freezing the game.
+#
+# Update() also sets where RenderThings() draws movable things, between
+# the last two steps, so a low rate still looks smooth.
+# Give it a PhysicsSystem to step that instead of HandlePhysics().
+
+# Usage:
+'''
+myScheduler = z3dpy.PhysicsScheduler([myCharacter, thatTree, joe], rate=30)
+
+# Then during the draw loop...
+
+        z3dpy.GetDelta()
+
+        myScheduler.Update()
+
+        for tri in z3dpy.Render():
+'''
+
+class PhysicsScheduler():
+    def __init__(self, things, emitters=None, rate=60, maxSteps=5, floorHeight=0, train=None, system=None):
+        self.things = things
+        self.emitters = emitters
+        self.step = 1.0 / rate
+        self.maxSteps = maxSteps
+        self.floorHeight = floorHeight
+        self.train = train
+        self.system = system
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.previous = {}
+        self.onStep = None
+
+    def __repr__(self):
+        return "Z3dPy PhysicsScheduler:\n\tRate: " + str(1.0 / self.step) + "\n\tMax Steps: " + str(self.maxSteps) + "\n\tAlpha: " + str(self.alpha) + "\n\t"
+
+    def GetClass(self):
+        return "PhysicsScheduler"
+
+    # Pass in the frame time, or it uses delta from GetDelta()
+    # Returns how many steps were done
+    def Update(self, frameTime=None):
+        global delta
+        global interpPrevious
+        global interpAlpha
+        frameDelta = delta
+        self.accumulator = min(self.accumulator + (delta if frameTime is None else frameTime), self.step * self.maxSteps)
+        steps = int(self.accumulator / self.step)
+        if steps:
+            delta = self.step
+            for s in range(steps):
+                if s == steps - 1:
+                    # Only the last step matters for drawing
+                    self.previous = {id(t): (list(t.position), list(t.rotation)) for t in self.things if type(t) is not list and t.movable}
+                self.Step()
+            delta = frameDelta
+            self.accumulator -= steps * self.step
+        self.alpha = self.accumulator / self.step
+        interpPrevious = self.previous
+        interpAlpha = self.alpha
+        return steps
+
+    def Step(self):
+        if self.system:
+            self.system.Step(self.floorHeight, self.train)
+            self.system.Push()
+        elif self.train is not None:
+            HandlePhysicsTrain(self.things, self.train)
+        else:
+            HandlePhysicsFloor(self.things, self.floorHeight)
+        PhysicsCollisions(self.things)
+        if self.system:
+            self.system.Pull()
+        if self.emitters is None:
+            HandleEmitters()
+        else:
+            HandleEmitters(self.emitters)
+        if self.onStep:
+            self.onStep()
+
+
 
 
 #==========================================================================
@@ -2598,67 +4508,136 @@ def Render(sort_key=TriSortAverage, b_reverse=True):
     llayer = min(llen - 1, 2)
     finished += RenderMeshList([trainMesh])
     for l in range(llen):
-        finished += RenderThings(layers[l], emitters if l == llayer else [], sort_key, b_reverse)
+        finished += RenderThings(layers[l], emitters if l == llayer else [], sort_key, b_reverse, layerDrawDistances.get(l, 0))
     
     return finished
 
 
+# Frustum Culling
+#
+# Tests a world-space sphere against the camera's view, the same planes
+# the tris are clipped against later.
+
+def SphereInFrustum(centre, radius):
+    v = Vec3MatrixMul(centre, intMatV)
+    if v[2] + radius < iC[4] or v[2] - radius > iC[5]:
+        return False
+    # On screen while abs(x * howX / z) <= 1
+    if abs(v[0]) * howX - v[2] > radius * sqrt(howX * howX + 1):
+        return False
+    return abs(v[1]) * howY - v[2] <= radius * sqrt(howY * howY + 1)
+
+# False if something at pos is further away than distance, 0 is no limit
+def InDrawDistance(pos, distance):
+    if not distance:
+        return True
+    x = pos[0] - iC[0][0]
+    y = pos[1] - iC[0][1]
+    z = pos[2] - iC[0][2]
+    return x * x + y * y + z * z <= distance * distance
+
+# Where to draw a movable thing, blended between physics steps when a
+# PhysicsScheduler is running.
+def ThingDrawPlacement(thing):
+    previous = interpPrevious.get(id(thing))
+    if previous is None or interpAlpha >= 1.0:
+        return thing.position, thing.rotation
+    a = interpAlpha
+    pos = thing.position
+    rot = thing.rotation
+    return [(pos[0] - previous[0][0]) * a + previous[0][0], (pos[1] - previous[0][1]) * a + previous[0][1], (pos[2] - previous[0][2]) * a + previous[0][2]], [(rot[0] - previous[1][0]) * a + previous[1][0], (rot[1] - previous[1][1]) * a + previous[1][1], (rot[2] - previous[1][2]) * a + previous[1][2]]
+
+# False if the mesh can be skipped. Leave out rot for static meshes.
+def MeshInView(mesh, pos, rot=None, scale=(1.0, 1.0, 1.0)):
+    if mesh.bounds is None or not frustumCulling:
+        return True
+    if rot is None:
+        return SphereInFrustum(VectorAdd(mesh.bounds[0], pos), mesh.bounds[1])
+    return SphereInFrustum(Vec3MatrixMul(VectorMul(mesh.bounds[0], scale), PointAtMatrix(pos, VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0))), RotTo(rot, (0.0, 1.0, 0.0)))), mesh.bounds[1] * max(abs(scale[0]), abs(scale[1]), abs(scale[2])))
+
 # RenderThings()
 # Specify your own list of things to render.
+# drawDistance overrides the draw distance of every Thing, 0 uses their own.
 
-def RenderThings(things, emitters=[], sortKey=TriSortAverage, bReverse=True):
+def RenderThings(things, emitters=[], sortKey=TriSortAverage, bReverse=True, drawDistance=0):
     try:
         intMatV[0][0]
     except:
         print("Internal Camera is not set. Use z3dpy.SetInternalCam(yourCamera) before rendering.")
         return []
     else:
-        viewed = []
-        for t in things:
-            if type(t) is list:
-                # Dupe
-                if things[t[0]].visible:
-                    for m in things[t[0]].meshes:
-                        if m.visible:
-                            if m.cull:
-                                viewed += RasterPt1(m.tris, VectorAdd(m.position, t[1]), VectorAdd(m.rotation, t[2]), m.material, VectorMul(m.scale, things[t[0]].scale))
-                            else:
-                                viewed += RasterPt1NoCull(m.tris, VectorAdd(m.position, t[1]), VectorAdd(m.rotation, t[2]), m.material, VectorMul(m.scale, things[t[0]].scale))
+        UpdateLightGrid()
+        try:
+            if fusedPipeline:
+                pt1, pt1NoCull, pt1Static, pt1StaticNoCull = RasterPt1Fused, RasterPt1NoCullFused, RasterPt1StaticFused, RasterPt1StaticNoCullFused
             else:
-                if t.visible:
-                    if t.movable:
-                        # bMovable
-                        for m in t.meshes:
+                pt1, pt1NoCull, pt1Static, pt1StaticNoCull = RasterPt1, RasterPt1NoCull, RasterPt1Static, RasterPt1StaticNoCull
+            viewed = []
+            for t in things:
+                if type(t) is list:
+                    # Dupe
+                    if things[t[0]].visible and InDrawDistance(t[1], drawDistance or things[t[0]].drawDistance):
+                        for m in things[t[0]].meshes:
                             if m.visible:
-                                if m.frame == -1:
-                                    # Standard Mesh
+                                pos = VectorAdd(m.position, t[1])
+                                rot = VectorAdd(m.rotation, t[2])
+                                scale = VectorMul(m.scale, things[t[0]].scale)
+                                if MeshInView(m, pos, rot, scale):
                                     if m.cull:
-                                        viewed += RasterPt1(m.tris, VectorAdd(m.position, t.position), VectorAdd(m.rotation, t.rotation), m.material, VectorMul(m.scale, t.scale))
+                                        viewed += pt1(m.tris, pos, rot, m.material, scale)
                                     else:
-                                        viewed += RasterPt1NoCull(m.tris, VectorAdd(m.position, t.position), VectorAdd(m.rotation, t.rotation), m.material, VectorMul(m.scale, t.scale))
-                                else:
-                                    # AniMesh
-                                    length = len(m.tris)
-                                    if m.frame >= length:
-                                        m.frame -= length
-                                    if m.cull:
-                                        viewed += RasterPt1(m.tris[m.frame], VectorAdd(m.position, t.position), VectorAdd(m.rotation, t.rotation), m.material, VectorMul(m.scale, t.scale))
+                                        viewed += pt1NoCull(m.tris, pos, rot, m.material, scale)
+                else:
+                    # AniMesh frames wrap before any culling or draw
+                    # distance, so they stay in range while out of view
+                    for m in t.meshes:
+                        if m.frame != -1:
+                            m.frame %= len(m.tris)
+                    if t.visible and InDrawDistance(t.position, drawDistance or t.drawDistance):
+                        if t.movable:
+                            # bMovable
+                            tPos, tRot = ThingDrawPlacement(t)
+                            for m in t.meshes:
+                                if m.visible:
+                                    pos = VectorAdd(m.position, tPos)
+                                    rot = VectorAdd(m.rotation, tRot)
+                                    scale = VectorMul(m.scale, t.scale)
+                                    if not MeshInView(m, pos, rot, scale):
+                                        continue
+                                    if m.frame == -1:
+                                        # Standard Mesh
+                                        if m.cull:
+                                            viewed += pt1(m.tris, pos, rot, m.material, scale)
+                                        else:
+                                            viewed += pt1NoCull(m.tris, pos, rot, m.material, scale)
                                     else:
-                                        viewed += RasterPt1NoCull(m.tris[m.frame], VectorAdd(m.position, t.position), VectorAdd(m.rotation, t.rotation), m.material, VectorMul(m.scale, t.scale))
-                    else:
-                        # not bMovable
-                        for m in t.meshes:
-                            if m.visible:
-                                if m.cull:
-                                    viewed += RasterPt1Static(m.tris, VectorAdd(m.position, t.position), m.material)
-                                else:
-                                    viewed += RasterPt1StaticNoCull(m.tris, VectorAdd(m.position, t.position), m.material)
-
-        for em in emitters:
-            for p in em.particles:
-                viewed += RasterPt1(em.template.tris, p[1], p[2], em.template.material, em.template.scale)
-
-        viewed.sort(key=sortKey, reverse=bReverse)
+                                        # AniMesh
+                                        if m.cull:
+                                            viewed += pt1(m.tris[m.frame], pos, rot, m.material, scale)
+                                        else:
+                                            viewed += pt1NoCull(m.tris[m.frame], pos, rot, m.material, scale)
+                        else:
+                            # not bMovable
+                            for m in t.meshes:
+                                if m.visible:
+                                    pos = VectorAdd(m.position, t.position)
+                                    if MeshInView(m, pos):
+                                        if m.cull:
+                                            viewed += pt1Static(m.tris, pos, m.material)
+                                        else:
+                                            viewed += pt1StaticNoCull(m.tris, pos, m.material)
+
+            for em in emitters:
+                for p in em.particles:
+                    if MeshInView(em.template, p[1], p[2], em.template.scale):
+                        viewed += pt1(em.template.tris, p[1], p[2], em.template.material, em.template.scale)
+        finally:
+            ClearLightGrid()
+
+        # With a depth buffer there's no need to sort, use sortKey=None
+        viewed = SortTris(viewed, sortKey, bReverse, things)
+        if fusedPipeline:
+            return RasterPt3Fused(viewed)
         return RasterPt3(viewed)
     
 
@@ -2671,10 +4650,18 @@ def RenderMeshList(meshList, sortKey=TriSortAverage, bReverse=True):
     except:
         print("Internal Camera is not set. Use z3dpy.SetInternalCam(yourCamera) before rendering.")
     else:
+        UpdateLightGrid()
         viewed = []
-        for mesh in meshList:
-            viewed += RasterPt1(mesh.tris, mesh.position, mesh.rotation, mesh.material, mesh.scale)
-        viewed.sort(key=sortKey, reverse=bReverse)
+        pt1 = RasterPt1Fused if fusedPipeline else RasterPt1
+        try:
+            for mesh in meshList:
+                if MeshInView(mesh, mesh.position, mesh.rotation, mesh.scale):
+                    viewed += pt1(mesh.tris, mesh.position, mesh.rotation, mesh.material, mesh.scale)
+        finally:
+            ClearLightGrid()
+        viewed = SortTris(viewed, sortKey, bReverse, meshList)
+        if fusedPipeline:
+            return RasterPt3Fused(viewed)
         return RasterPt3(viewed)
 
 # Draws things, as well as hitboxes, and any lights/rays you give it. 
@@ -2728,44 +4715,217 @@ def DebugRender(train=[], sortKey=TriSortAverage, bReverse=True, clearRays=False
         
         return RasterPt3(viewed)
 
+# MeshBuffers are done in batches with NumPy, if it's installed.
+def IsBatch(tris):
+    return np is not None and type(tris) is MeshBuffer
+
 def RasterPt1(tris, pos, rot, material, scale=(1.0, 1.0, 1.0)):
     trg = VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0)))
     up = RotTo(rot, (0.0, 1.0, 0.0))
+    if IsBatch(tris):
+        return RasterPt2Batch(*TransformTrisBatch(tris, pos, trg, up, scale, False, material), tris, material)
     return RasterPt2NoPos(TransformTris(tris, pos, trg, up, scale, False, material), material)
 
 def RasterPt1PointAt(tris, pos, target, up, material, scale=(1.0, 1.0, 1.0)):
+    if IsBatch(tris):
+        return RasterPt2Batch(*TransformTrisBatch(tris, pos, target, up, scale, False, material), tris, material)
     return RasterPt2NoPos(TransformTris(tris, pos, target, up, scale, False, material), material)
 
 def RasterPt1NoCull(tris, pos, rot, material, scale=(1.0, 1.0, 1.0)):
     trg = VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0)))
     up = RotTo(rot, (0.0, 1.0, 0.0))
+    if IsBatch(tris):
+        return RasterPt2Batch(*TransformTrisBatch(tris, pos, trg, up, scale, True, material), tris, material)
     return RasterPt2NoPos(TransformTris(tris, pos, trg, up, scale, True, material), material)
 
 def RasterPt1StaticNoCull(tris, pos, material):
+    if IsBatch(tris):
+        return RasterPt2Batch(*TranslateTrisBatch(tris, pos, True), tris, material)
     return RasterPt2(tris, pos, material)
 
 
 def RasterPt1Static(tris, pos, material):
-    return RasterPt2([tri[:4] + [material.Local(tri)] + tri[5:] for tri in tris if DotProduct(VectorMul(tri[3], (-1, 1, 1)), iC[6]) > -0.4], pos, material)
+    if IsBatch(tris):
+        return RasterPt2Batch(*TranslateTrisBatch(tris, pos, False, material), tris, material)
+    return RasterPt2([tri[:4] + [material.Local(tri)] + tri[5:] for tri in tris if TriHasPointShades(tri) or DotProduct(VectorMul(tri[3], (-1, 1, 1)), iC[6]) > -0.4], pos, material)
 
 def RasterPt2(tris, pos, material):
     output = []
     for tri in ViewTris(TranslateTris(tris, pos)):
         tri[4] = material.View(tri)
-        output += TriClipAgainstPlane(tri, (0.0, 0.0, 0.1), (0.0, 0.0, 1.0))
+        output += TriClipAgainstNearFar(tri)
     return output
 
 def RasterPt2NoPos(tris, material):
     output = []
     for t in ViewTris(tris):
         t[4] = material.View(t)
-        output += TriClipAgainstPlane(t, (0.0, 0.0, 0.1), (0.0, 0.0, 1.0))
+        output += TriClipAgainstNearFar(t)
+    return output
+
+# Takes the output of TransformTrisBatch() or TranslateTrisBatch(), and
+# does the view stage on all the points before going back to tris.
+def RasterPt2Batch(points, index, colours, buffer, material):
+    points = GatherTris(ViewTrisBatch(points), buffer, index)
+    # Only tris that poke through the near or far plane need clipping
+    inside = ((points[:, :, 2] >= iC[4]) & (points[:, :, 2] <= iC[5])).all(1).tolist()
+    output = []
+    for t, keep in zip(BatchToTris(points, index, colours, buffer), inside):
+        if material.View is not SHADER_UNLIT:
+            t[4] = material.View(t)
+        if keep:
+            output.append(t)
+        else:
+            output += TriClipAgainstNearFar(t)
     return output
 
 
 def RasterPt3(tris):
     return (tri for i in ProjectTris(tris) for tri in TriClipAgainstScreenEdges(i))
 
+# Fused Rastering
+#
+# Instead of going through the Transform, View, and Project stages
+# separately, each mesh gets one combined model-view matrix, so every point
+# is multiplied once. Backface culling and near clipping happen in view space,
+# then the points are divided by their depth (w) to project them.
+#
+# The output is already projected, so it only needs RasterPt3Fused() for
+# the screen edges.
+#
+# World shaders need world-space tris, so materials with a World shader
+# fall back to the regular stages.
+
+def RasterPt1Fused(tris, pos, rot, material, scale=(1.0, 1.0, 1.0)):
+    trg = VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0)))
+    up = RotTo(rot, (0.0, 1.0, 0.0))
+    if material.World is not SHADER_UNLIT:
+        return [ProjectTriScreen(t) for t in RasterPt1(tris, pos, rot, material, scale)]
+    return RasterPt2Fused(tris, ModelViewMatrix(pos, trg, up, scale), material)
+
+def RasterPt1NoCullFused(tris, pos, rot, material, scale=(1.0, 1.0, 1.0)):
+    trg = VectorAdd(pos, RotTo(rot, (0.0, 0.0, 1.0)))
+    up = RotTo(rot, (0.0, 1.0, 0.0))
+    if material.World is not SHADER_UNLIT:
+        return [ProjectTriScreen(t) for t in RasterPt1NoCull(tris, pos, rot, material, scale)]
+    return RasterPt2Fused(tris, ModelViewMatrix(pos, trg, up, scale), material, True)
+
+def RasterPt1StaticFused(tris, pos, material):
+    return RasterPt2Fused(tris, TranslateViewMatrix(pos), material, False, True)
+
+def RasterPt1StaticNoCullFused(tris, pos, material):
+    return RasterPt2Fused(tris, TranslateViewMatrix(pos), material, True, True)
+
+# Static tris are culled the same way as RasterPt1Static()
+def RasterPt2Fused(tris, mMV, material, noCull=False, static=False):
+    if IsBatch(tris):
+        return RasterPt2FusedBatch(tris, mMV, material, noCull, static)
+    output = []
+    local = material.Local is not SHADER_UNLIT and not (static and noCull)
+    view = material.View is not SHADER_UNLIT
+    m00, m01, m02 = mMV[0][0], mMV[0][1], mMV[0][2]
+    m10, m11, m12 = mMV[1][0], mMV[1][1], mMV[1][2]
+    m20, m21, m22 = mMV[2][0], mMV[2][1], mMV[2][2]
+    m30, m31, m32 = mMV[3][0], mMV[3][1], mMV[3][2]
+    hX = howX * iC[3]
+    hY = howY * iC[2]
+    near = iC[4]
+    far = iC[5]
+    for t in tris:
+        if static and not noCull and not TriHasPointShades(t):
+            if DotProduct(VectorMul(t[3], (-1, 1, 1)), iC[6]) <= -0.4:
+                continue
+        p1 = t[0]
+        p2 = t[1]
+        p3 = t[2]
+        x1 = p1[0] * m00 + p1[1] * m10 + p1[2] * m20 + m30
+        y1 = p1[0] * m01 + p1[1] * m11 + p1[2] * m21 + m31
+        z1 = p1[0] * m02 + p1[1] * m12 + p1[2] * m22 + m32
+        x2 = p2[0] * m00 + p2[1] * m10 + p2[2] * m20 + m30
+        y2 = p2[0] * m01 + p2[1] * m11 + p2[2] * m21 + m31
+        z2 = p2[0] * m02 + p2[1] * m12 + p2[2] * m22 + m32
+        x3 = p3[0] * m00 + p3[1] * m10 + p3[2] * m20 + m30
+        y3 = p3[0] * m01 + p3[1] * m11 + p3[2] * m21 + m31
+        z3 = p3[0] * m02 + p3[1] * m12 + p3[2] * m22 + m32
+        if not (noCull or static):
+            # The view matrix doesn't stretch anything, so the world-space
+            # normal facing the camera is the same as the view-space normal's z.
+            ax = x2 - x1
+            ay = y2 - y1
+            az = z2 - z1
+            bx = x3 - x1
+            by = y3 - y1
+            bz = z3 - z1
+            nx = ay * bz - az * by
+            ny = az * bx - ax * bz
+            nz = ax * by - ay * bx
+            l = sqrt(nx * nx + ny * ny + nz * nz)
+            if l and nz / l >= 0.4:
+                continue
+        col = material.Local(t) if local else t[4]
+        if view or not (near <= z1 <= far and near <= z2 <= far and near <= z3 <= far):
+            nt = [[x1, y1, z1, p1[3], p1[4]], [x2, y2, z2, p2[3], p2[4]], [x3, y3, z3, p3[3], p3[4]], t[3], col, t[5], t[6]]
+            if view:
+                nt[4] = material.View(nt)
+            output += [ProjectTriScreen(c) for c in TriClipAgainstNearFar(nt)]
+        else:
+            output.append([[x1 * hX / z1 + iC[3], y1 * hY / z1 + iC[2], z1, p1[3], p1[4]], [x2 * hX / z2 + iC[3], y2 * hY / z2 + iC[2], z2, p2[3], p2[4]], [x3 * hX / z3 + iC[3], y3 * hY / z3 + iC[2], z3, p3[3], p3[4]], t[3], col, t[5], t[6]])
+    return output
+
+# Each point is multiplied and projected once, before being put together into tris
+def RasterPt2FusedBatch(buffer, mMV, material, noCull=False, static=False):
+    m = np.array(mMV, dtype=np.float64)
+    points = np.asarray(buffer.points).reshape(-1, 3) @ m[:3, :3] + m[3, :3]
+    faces = np.asarray(buffer.indices).reshape(-1, 3)
+    if noCull:
+        index = np.arange(len(faces))
+    else:
+        if static:
+            if buffer.pointShades is not None:
+                index = np.arange(len(faces))
+            else:
+                index = np.flatnonzero((np.asarray(buffer.shades).reshape(-1, 3) * (-1, 1, 1)) @ np.asarray(iC[6], dtype=np.float64) > -0.4)
+        else:
+            index = np.flatnonzero(TriGetNormalsBatch(points[faces])[:, 2] < 0.4)
+    tris = points[faces[index]]
+    colours = np.asarray(buffer.colours).reshape(-1, 3)[index].tolist()
+    if material.Local is not SHADER_UNLIT and not (static and noCull):
+        colours = [material.Local(buffer[i]) for i in index.tolist()]
+    if material.View is not SHADER_UNLIT:
+        output = []
+        for t in BatchToTris(tris, index, colours, buffer):
+            t[4] = material.View(t)
+            output += [ProjectTriScreen(c) for c in TriClipAgainstNearFar(t)]
+        return output
+    front = (points[:, 2] >= iC[4]) & (points[:, 2] <= iC[5])
+    projected = points.copy()
+    z = projected[front, 2]
+    projected[front, 0] = projected[front, 0] * (howX * iC[3]) / z + iC[3]
+    projected[front, 1] = projected[front, 1] * (howY * iC[2]) / z + iC[2]
+    output = BatchToTris(projected[faces[index]], index, colours, buffer)
+    inside = front[faces[index]].all(1)
+    if inside.all():
+        return output
+    # Tris poking through the near or far plane are clipped in view space first
+    for n in np.flatnonzero(~inside)[::-1].tolist():
+        output[n:n + 1] = [ProjectTriScreen(c) for c in TriClipAgainstNearFar(BatchToTris(tris[n:n + 1], index[n:n + 1], colours[n:n + 1], buffer)[0])]
+    return output
+
+def RasterPt3Fused(tris):
+    return (tri for i in tris for tri in TriClipAgainstScreenEdges(i))
+
+# Scale, then PointAt, then View, in one matrix
+def ModelViewMatrix(pos, trg, up=(0.0, 1.0, 0.0), scale=(1.0, 1.0, 1.0)):
+    mS = ((scale[0], 0.0, 0.0, 0.0), (0.0, scale[1], 0.0, 0.0), (0.0, 0.0, scale[2], 0.0), (0.0, 0.0, 0.0, 1.0))
+    return MatrixMatrixMul(MatrixMatrixMul(mS, PointAtMatrix(pos, trg, up)), intMatV)
+
+def TranslateViewMatrix(pos):
+    return MatrixMatrixMul(((1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (pos[0], pos[1], pos[2], 1.0)), intMatV)
+
+# Same as ProjectTris(), for a single view-space tri
+def ProjectTriScreen(t):
+    return TriMul(TriAdd(ProjectTri(t), [1, 1, 0]), [iC[3], iC[2], 1])
+
 # Lowest-Level Raster Functions
 # Rastering is based on Javidx9's C++ series, although
 # the resemblance is drifting further.
@@ -2784,6 +4944,10 @@ def RasterPt3(tris):
 
 def TransformTris(tris, pos, trg, up=(0.0, 1.0, 0.0), scale=(1, 1, 1), noCull=False, material=MATERIAL_UNLIT):
     mW = PointAtMatrix(pos, trg, up)
+    if material.World is SHADER_DYNAMIC and np is not None:
+        # Light the whole mesh at once
+        yield from TransformTrisDynamic(tris, mW, scale, noCull, material)
+        return
     for t in tris:
         col = material.Local(t)
         nt = TriMatrixMul(TriMul(t, scale), mW)
@@ -2792,9 +4956,98 @@ def TransformTris(tris, pos, trg, up=(0.0, 1.0, 0.0), scale=(1, 1, 1), noCull=Fa
             nt[4] = material.World(nt)
             yield nt
 
+def TransformTrisDynamic(tris, mW, scale, noCull, material):
+    output = []
+    for t in tris:
+        col = material.Local(t)
+        nt = TriMatrixMul(TriMul(t, scale), mW)
+        nt[4] = col
+        if DotProduct(TriGetNormal(nt), iC[6]) < 0.4 or noCull:
+            output.append(nt)
+    if not output:
+        return output
+    points = np.array([[t[0][:3], t[1][:3], t[2][:3]] for t in output], dtype=np.float64)
+    lit = CheapLightingBatch(TriAveragesBatch(points), TriGetNormalsBatch(points), lights)
+    for nt, colour in zip(output, (np.asarray([t[4] for t in output], dtype=np.float64) * lit).tolist()):
+        nt[4] = colour
+    return output
+
 def ViewTris(tris):
     return (TriMatrixMul(tri, intMatV) for tri in tris)
                     
+# Batch Transforming
+#
+# The same stages for MeshBuffers, but the whole mesh is done at once
+# with NumPy.
+#
+# Transform returns the world-space points as a (points, 3) array, the
+# indices of the tris that survived culling, and their colours. Each
+# point is only transformed once, no matter how many tris share it.
+# GatherTris() puts them back together into a (tris, 3, 3) array.
+#
+# Local and World shaders are still called per tri, but only if they
+# aren't SHADER_UNLIT, and only for the tris that are left.
+
+def TransformTrisBatch(buffer, pos, trg, up=(0.0, 1.0, 0.0), scale=(1, 1, 1), noCull=False, material=MATERIAL_UNLIT):
+    mW = np.array(PointAtMatrix(pos, trg, up), dtype=np.float64)
+    points = (np.asarray(buffer.points).reshape(-1, 3) * scale) @ mW[:3, :3] + mW[3, :3]
+    if noCull:
+        index = np.arange(len(buffer))
+    else:
+        index = np.flatnonzero(TriGetNormalsBatch(GatherTris(points, buffer)) @ np.asarray(iC[6], dtype=np.float64) < 0.4)
+    colours = np.asarray(buffer.colours).reshape(-1, 3)[index].tolist()
+    if material.Local is not SHADER_UNLIT:
+        colours = [material.Local(buffer[i]) for i in index.tolist()]
+    if material.World is SHADER_DYNAMIC:
+        tris = GatherTris(points, buffer, index)
+        colours = (np.asarray(colours, dtype=np.float64).reshape(-1, 3) * CheapLightingBatch(TriAveragesBatch(tris), TriGetNormalsBatch(tris), lights)).tolist()
+    elif material.World is not SHADER_UNLIT:
+        colours = [material.World(t) for t in BatchToTris(GatherTris(points, buffer, index), index, colours, buffer)]
+    return points, index, colours
+
+# Static version, only moves the tris. Uses the same culling as
+# RasterPt1Static()
+def TranslateTrisBatch(buffer, pos, noCull=False, material=MATERIAL_UNLIT):
+    points = np.asarray(buffer.points).reshape(-1, 3) + np.asarray(pos, dtype=np.float64)
+    if noCull or buffer.pointShades is not None:
+        index = np.arange(len(buffer))
+    else:
+        index = np.flatnonzero((np.asarray(buffer.shades).reshape(-1, 3) * (-1, 1, 1)) @ np.asarray(iC[6], dtype=np.float64) > -0.4)
+    colours = np.asarray(buffer.colours).reshape(-1, 3)[index].tolist()
+    if not noCull and material.Local is not SHADER_UNLIT:
+        colours = [material.Local(buffer[i]) for i in index.tolist()]
+    return points, index, colours
+
+def ViewTrisBatch(points):
+    mV = np.array(intMatV, dtype=np.float64)
+    return points @ mV[:3, :3] + mV[3, :3]
+
+# Puts the points of each tri together, all of them if index is None
+def GatherTris(points, buffer, index=None):
+    faces = np.asarray(buffer.indices).reshape(-1, 3)
+    if index is None:
+        return points[faces]
+    return points[faces[index]]
+
+# Same as TriGetNormal(), for a (tris, 3, 3) array
+def TriGetNormalsBatch(points):
+    normals = np.cross(points[:, 1] - points[:, 0], points[:, 2] - points[:, 0])
+    lengths = np.sqrt((normals * normals).sum(1))
+    lengths[lengths == 0.0] = 1.0
+    return normals / lengths[:, None]
+
+# Same as TriAverage(), for a (tris, 3, 3) array
+def TriAveragesBatch(points):
+    averages = points.sum(1) * 0.333333
+    averages[:, 2] = points[:, :, 1].sum(1) * 0.33333
+    return averages
+
+# Turns batched points back into regular tris, carrying the
+# normals, UVs, shade, id, and user variable from the buffer.
+def BatchToTris(points, index, colours, buffer):
+    attributes = buffer.GetAttributes()
+    return [[[p[0], p[1], p[2], a[0], a[1]], [p[3], p[4], p[5], a[2], a[3]], [p[6], p[7], p[8], a[4], a[5]], a[6], c, a[7], a[8]] for p, c, a in zip(points.reshape(-1, 9).tolist(), colours, map(attributes.__getitem__, index.tolist()))]
+
 def ProjectTris(tris):
     return (TriMul(TriAdd(ProjectTri(tri), [1, 1, 0]), [iC[3], iC[2], 1]) for tri in tris)
 
@@ -2848,11 +5101,127 @@ def MyShader(tri):
     return z3dpy.VectorMul(z3dpy.TriGetColour(tri), CheapLighting(tri))
 '''
 
+# LightGrid:
+#
+# Sorts point and spot lights into a grid, into every cell their radius
+# reaches, so a position only has to check the lights in it's cell. Sun
+# lights reach everywhere, and so do lights that would fill too many cells.
+# Query() gives them back in the same order as the list, so the lighting
+# comes out exactly the same as checking all of them.
+#
+# UpdateLightGrid() is done by RenderThings(), RenderMeshList() and
+# BakeLighting(), and only builds it again if a light was added, removed,
+# moved, or resized. ClearLightGrid() is done when they're finished, so
+# calling CheapLighting() yourself always checks every light.
+
+# Usage:
+'''
+# A few hundred small lights
+for x in range(20):
+    for z in range(20):
+        z3dpy.lights.append(z3dpy.Light(z3dpy.LIGHT_POINT, [x * 10, 0, z * 10], 0.8, 6))
+
+# MATERIAL_DYNAMIC tris only light themselves with the ones nearby
+for tri in z3dpy.Render():
+    # Draw code here
+'''
+
+class LightGrid():
+    def __init__(self, lightList, cellSize=0):
+        self.lights = lightList
+        self.signature = LightGridSignature(lightList)
+        self.everywhere = []
+        self.cells = {}
+        self.merged = {}
+        local = []
+        for i, l in enumerate(lightList):
+            if l.type == 1:
+                self.everywhere.append(i)
+            else:
+                local.append(i)
+        # Cells about as big as the lights
+        self.cellSize = cellSize or max(sum(lightList[i].radius for i in local) / max(len(local), 1), 1e-6)
+        size = self.cellSize
+        for i in local:
+            l = lightList[i]
+            lo = [floor((l.position[a] - l.radius) / size) for a in range(3)]
+            hi = [floor((l.position[a] + l.radius) / size) for a in range(3)]
+            if (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1) > 4096:
+                self.everywhere.append(i)
+                continue
+            for x in range(lo[0], hi[0] + 1):
+                for y in range(lo[1], hi[1] + 1):
+                    for z in range(lo[2], hi[2] + 1):
+                        self.cells.setdefault((x, y, z), []).append(i)
+
+    def __repr__(self):
+        return "Z3dPy LightGrid:\n\tLights: " + str(len(self.lights)) + "\n\tCells: " + str(len(self.cells)) + "\n\tCell Size: " + str(self.cellSize) + "\n\t"
+
+    def GetClass(self):
+        return "LightGrid"
+
+    # The lights that might reach pos
+    def Query(self, pos):
+        size = self.cellSize
+        key = (floor(pos[0] / size), floor(pos[1] / size), floor(pos[2] / size))
+        found = self.merged.get(key)
+        if found is None:
+            found = [self.lights[i] for i in sorted(self.cells.get(key, []) + self.everywhere)]
+            self.merged[key] = found
+        return found
+
+    # The lights that might reach anything in the box from lo to hi, in the
+    # same order as the list
+    def QueryBox(self, lo, hi):
+        size = self.cellSize
+        lo = [floor(lo[a] / size) for a in range(3)]
+        hi = [floor(hi[a] / size) for a in range(3)]
+        found = set(self.everywhere)
+        if (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1) > len(self.cells):
+            # Quicker to look through the cells there are
+            for key, inCell in self.cells.items():
+                if lo[0] <= key[0] <= hi[0] and lo[1] <= key[1] <= hi[1] and lo[2] <= key[2] <= hi[2]:
+                    found.update(inCell)
+        else:
+            for x in range(lo[0], hi[0] + 1):
+                for y in range(lo[1], hi[1] + 1):
+                    for z in range(lo[2], hi[2] + 1):
+                        found.update(self.cells.get((x, y, z), ()))
+        return [self.lights[i] for i in sorted(found)]
+
+def LightGridSignature(lightList):
+    return tuple((id(l), l.type, l.radius, tuple(l.position) if l.type != 1 else None) for l in lightList)
+
+def UpdateLightGrid(lightList=None):
+    global lightGrid
+    global lightGridCache
+    if lightList is None:
+        lightList = lights
+    if not lightCulling or len(lightList) < lightGridMinimum:
+        lightGrid = None
+        return
+    if lightGridCache is None or lightGridCache.lights is not lightList or lightGridCache.signature != LightGridSignature(lightList):
+        lightGridCache = LightGrid(lightList)
+    lightGrid = lightGridCache
+
+def ClearLightGrid():
+    global lightGrid
+    lightGrid = None
+
 # CheapLighting takes the direction towards the light source, no shadow checks or anything.
 def CheapLighting(tri, lights=lights):
+    triPos = TriAverage(tri)
+    if lightGrid is not None and lights is lightGrid.lights:
+        lights = lightGrid.Query(triPos)
+        if not lights:
+            # Same as when none of them reach
+            return VectorMax((0.0, 0.0, 0.0), worldColour)
+    return LightingAt(triPos, TriGetNormal(tri), lights)
+
+# CheapLighting() for any position and normal, like a point and it's normal
+def LightingAt(triPos, normal, lights=lights):
     colour = (0.0, 0.0, 0.0)
     intensity = 0.0
-    triPos = TriAverage(tri)
     num = 0
     if not len(lights):
         return (0, 0, 0)
@@ -2863,7 +5232,7 @@ def CheapLighting(tri, lights=lights):
                 dist = DistanceBetweenVectors(triPos, l.position)
                 if dist <= l.radius:
                     lightDir = DirectionBetweenVectors(l.position, triPos)
-                    if (dot := DotProduct(lightDir, TriGetNormal(tri))) < 0:
+                    if (dot := DotProduct(lightDir, normal)) < 0:
                         d = dist/l.radius
                         intensity = (1 - (d * d)) * l.strength
                         colour = VectorAdd(colour, VectorMulF(l.colour, intensity * -dot))
@@ -2871,7 +5240,7 @@ def CheapLighting(tri, lights=lights):
 
             case 1:
                 # LIGHT_SUN
-                if (dot := DotProduct(l.position, TriGetNormal(tri))) < 0:
+                if (dot := DotProduct(l.position, normal)) < 0:
                     intensity = -dot * l.strength
                     colour = VectorAdd(colour, VectorMulF(l.colour, intensity))
                     num += 1
@@ -2890,6 +5259,78 @@ def CheapLighting(tri, lights=lights):
     inverse = 1/max(num, 1)
     return VectorMax(VectorMinF(VectorMulF(colour, inverse), 1.0), worldColour)
 
+# CheapLightingBatch
+#
+# LightingAt() for a whole mesh at once with NumPy. Takes the world-space
+# centre and normal of each tri as (tris, 3) arrays, and gives back a
+# (tris, 3) array of colours, the same as calling CheapLighting() on each.
+#
+# While RenderThings() or RenderMeshList() has the lights in a LightGrid,
+# only the lights in the cells the tris are in are looked at, and lights
+# that can't reach any of the tris are skipped.
+#
+# TransformTris() and TransformTrisBatch() use it for SHADER_DYNAMIC, so
+# there's no need to call it yourself unless you've got your own shader.
+
+# Usage:
+'''
+centres = z3dpy.TriAveragesBatch(points)
+normals = z3dpy.TriGetNormalsBatch(points)
+colours = z3dpy.CheapLightingBatch(centres, normals) * myColours
+'''
+
+def CheapLightingBatch(centres, normals, lights=lights):
+    if np is None:
+        raise ImportError("CheapLightingBatch needs NumPy")
+    centres = np.asarray(centres, dtype=np.float64).reshape(-1, 3)
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    count = len(centres)
+    if not len(lights):
+        return np.zeros((count, 3))
+    colour = np.zeros((count, 3))
+    num = np.zeros(count)
+    if count:
+        lo = centres.min(0)
+        hi = centres.max(0)
+        if lightGrid is not None and lights is lightGrid.lights:
+            lights = lightGrid.QueryBox(lo.tolist(), hi.tolist())
+    for l in lights:
+        if l.type == 1:
+            # LIGHT_SUN
+            dot = normals @ np.asarray(l.position, dtype=np.float64)
+            lit = dot < 0
+            colour += np.outer(np.where(lit, -dot * l.strength, 0.0), l.colour)
+            num += lit
+            continue
+        if not count:
+            continue
+        position = np.asarray(l.position, dtype=np.float64)
+        # Too far from the whole mesh
+        gap = np.maximum(np.maximum(lo - position, position - hi), 0.0)
+        if (gap * gap).sum() > l.radius * l.radius:
+            continue
+        offset = centres - position
+        dist = np.sqrt((offset * offset).sum(1))
+        d = dist / l.radius
+        intensity = (1 - (d * d)) * l.strength
+        match l.type:
+            case 0:
+                # LIGHT_POINT
+                dot = (offset * normals).sum(1) / np.where(dist, dist, 1.0)
+                lit = (dist <= l.radius) & (dot < 0)
+                colour += np.outer(np.where(lit, intensity * -dot, 0.0), l.colour)
+                num += lit
+
+            case 2:
+                # LIGHT_SPOT
+                direction = np.asarray(l.direction, dtype=np.float64)
+                dot = (-offset @ direction) / np.where(dist, dist, 1.0)
+                lit = (dist < l.radius) & (offset @ direction > 0) & (dot < 0)
+                colour += np.outer(np.where(lit, intensity * -dot, 0.0), l.colour)
+
+    inverse = 1 / np.maximum(num, 1)
+    return np.maximum(np.minimum(colour * inverse[:, None], 1.0), worldColour)
+
 # ExpensiveLighting uses the direction towards the light source, and tests for ray collisions to create shadows.
 def ExpensiveLighting(tri, shadow_casters=GatherThings(), lights=lights):
     if shadow_casters == []:
@@ -2963,6 +5404,26 @@ def ExpensiveLighting(tri, shadow_casters=GatherThings(), lights=lights):
 
 # BakeLighting() saves the FlatLighting() calculation to the triangle's shade value, for cheaply referencing later.
 
+# The tris are baked in chunks of chunkSize. With processes other than 1, the
+# chunks are shared out to a pool of processes, None uses every core. Each
+# process gets the lights and shadow casters once when it starts, not with
+# every chunk. Progress is called with (tris done, total tris) after each
+# chunk.
+
+# Cache is the name of a file to keep the baked shades in. Each thing is
+# stored under a hash of its meshes, position and rotation, the lights, the
+# world colour, and whether it's expensive, which includes the shadow
+# casters. Things with nothing changed get their shades from the file, the
+# rest are baked and added to it.
+
+# With perVertex, each point gets it's own shade, lit with the point's normal
+# from LoadMesh(), and the shade is three shades instead of one. Each point
+# shared between tris is only lit once. MATERIAL_STATIC then gives each point
+# it's own colour, which RASTER_GOURAUD, and TriToPixels() and TriToTexels()
+# with gouraud=True, blend across the tri, so it looks smooth with a lot fewer tris.
+# It's always lit like CheapLighting(), without shadows. MeshBuffers keep
+# the shade of each of their points.
+
 # Usage:
 '''
 myLight = z3dpy.Light(z3dpy.LIGHT_POINT, [0.0, 0.0, 0.0], 0.8, 50, [255, 0, 0])
@@ -2973,6 +5434,18 @@ z3dpy.lights.append(myLight)
 # BakeLighting(things, *expensive, *lights, *thingsThatWillCastShadowsIfExpensive)
 BakeLighting([myThing, myOtherThing])
 
+# On every core, printing how far along it is
+def MyProgress(done, total):
+    print(done, "/", total)
+
+BakeLighting([myThing, myOtherThing], True, processes=None, progress=MyProgress)
+
+# Only baking what changed since last time
+BakeLighting([myThing, myOtherThing], cache="level1.bake")
+
+# Smooth lighting
+BakeLighting([myThing, myOtherThing], perVertex=True)
+
 # Then, during the draw loop...
 
 for tri in RenderThings([myThing, myOtherThing]):
@@ -2982,19 +5455,134 @@ for tri in RenderThings([myThing, myOtherThing]):
 
 # Baked Lighting:
 # Do the FlatLighting(), and bake it to the triangle's shade variable
-def BakeLighting(things, expensive=False, lights=lights, shadow_casters=-1):
+def BakeLighting(things, expensive=False, lights=lights, shadow_casters=-1, processes=1, progress=None, chunkSize=256, cache=None, perVertex=False):
     print("Baking Lighting...")
     if shadow_casters == -1:
         shadow_casters = things
+    if cache is not None:
+        stored = BakeCacheLoad(cache)
+        common = BakeCommonKey(expensive, lights, shadow_casters, perVertex)
+        keys = [BakeThingKey(th, common) for th in things]
+        baking = []
+        for th, key in zip(things, keys):
+            tris = [t for m in th.meshes for t in m.tris]
+            shades = stored.get(key)
+            if shades is not None and len(shades) == len(tris):
+                for t, shade in zip(tris, shades):
+                    t[3] = tuple(tuple(s) for s in shade) if type(shade[0]) is list else tuple(shade)
+            else:
+                baking.append(th)
+    else:
+        baking = things
+    UpdateLightGrid(lights)
+    try:
+        BakeThings(baking, expensive, lights, shadow_casters, processes, progress, chunkSize, perVertex)
+    finally:
+        ClearLightGrid()
+    # Only the current things are written back, so the cache doesn't keep
+    # every old version of them
+    if cache is not None and (baking or stored.keys() != set(keys)):
+        stored = {}
+        for th, key in zip(things, keys):
+            stored[key] = [[list(s) for s in t[3]] if TriHasPointShades(t) else list(t[3]) for m in th.meshes for t in m.tris]
+        with open(cache, 'w') as file:
+            file.write(dumps(stored))
+    print("Lighting Baked!")
+
+# Bakes every tri of things into their shades
+def BakeThings(things, expensive, lights, shadow_casters, processes=1, progress=None, chunkSize=256, perVertex=False):
+    targets = []
+    world = []
     for th in things:
         for m in th.meshes:
+            rot = VectorAdd(m.rotation, th.rotation)
+            pos = VectorAdd(m.position, th.position)
+            if perVertex:
+                # The normals need turning too
+                mR = MatrixMatrixMul(MatrixMatrixMul(MatrixMakeRotX(rot[0]), MatrixMakeRotY(rot[1])), MatrixMakeRotZ(rot[2]))
             for t in m.tris:
-                if expensive:
-                    calc = ExpensiveLighting(TranslateTri(TransformTri(t, VectorAdd(m.rotation, th.rotation)), VectorAdd(m.position, th.position)), shadow_casters, lights)
-                else:
-                    calc = CheapLighting(TranslateTri(TransformTri(t, VectorAdd(m.rotation, th.rotation)), VectorAdd(m.position, th.position)), lights)
-                t[3] = tuple(calc)
-    print("Lighting Baked!")
+                targets.append(t)
+                nt = TranslateTri(TransformTri(t, rot), pos)
+                if perVertex:
+                    nt = [[p[0], p[1], p[2], Vec3MatrixMul(p[3], mR), p[4]] for p in nt[:3]] + nt[3:]
+                world.append(nt)
+    total = len(world)
+    jobs = [(expensive, perVertex, world[i:i + chunkSize]) for i in range(0, total, chunkSize)]
+    done = 0
+    if processes == 1 or len(jobs) < 2:
+        for job in jobs:
+            for calc in BakeTris(job[2], job[0], job[1], shadow_casters, lights):
+                targets[done][3] = calc
+                done += 1
+            if progress:
+                progress(done, total)
+    else:
+        if expensive:
+            # Built once here, instead of once in each process
+            for th in shadow_casters:
+                for m in th.meshes:
+                    MeshGetBVH(m)
+        with Pool(processes or cpu_count(), BakeLightingSetup, (shadow_casters, lights, worldColour)) as pool:
+            for shades in pool.imap(BakeLightingChunk, jobs):
+                for calc in shades:
+                    targets[done][3] = calc
+                    done += 1
+                if progress:
+                    progress(done, total)
+
+# Baked Lighting Cache
+
+def BakeCacheLoad(filename):
+    try:
+        with open(filename) as file:
+            return loads(file.read())
+    except (OSError, ValueError):
+        return {}
+
+# Everything that changes the shades of every thing
+def BakeCommonKey(expensive, lights, shadow_casters, perVertex=False):
+    key = repr((1, bool(expensive), bool(perVertex), tuple(worldColour), [(l.type, getattr(l, "position", None), getattr(l, "direction", None), l.strength, l.radius, tuple(l.colour)) for l in lights]))
+    if expensive:
+        key += "".join(BakeThingKey(th, "") for th in shadow_casters)
+    return key
+
+def BakeThingKey(thing, common):
+    digest = sha1(common.encode())
+    digest.update(repr((list(thing.position), list(thing.rotation))).encode())
+    for m in thing.meshes:
+        digest.update(repr((list(m.position), list(m.rotation), [[list(p[:3]) + list(p[3]) for p in t[:3]] for t in m.tris])).encode())
+    return digest.hexdigest()
+
+# Lighting for a list of world-space tris
+def BakeTris(tris, expensive, perVertex, shadow_casters, lights):
+    if perVertex:
+        lit = {}
+        output = []
+        for t in tris:
+            shades = []
+            for p in t[:3]:
+                key = (p[0], p[1], p[2], p[3][0], p[3][1], p[3][2])
+                if key not in lit:
+                    lit[key] = tuple(LightingAt(p, VectorNormalize(p[3]), lights))
+                shades.append(lit[key])
+            output.append(tuple(shades))
+        return output
+    if expensive:
+        return [tuple(ExpensiveLighting(t, shadow_casters, lights)) for t in tris]
+    return [tuple(CheapLighting(t, lights)) for t in tris]
+
+def BakeLightingSetup(shadowCasters, lights, colour):
+    global bakeCasters
+    global bakeLights
+    global worldColour
+    bakeCasters = shadowCasters
+    bakeLights = lights
+    worldColour = colour
+    # Each process sorts the lights itself
+    UpdateLightGrid(lights)
+
+def BakeLightingChunk(job):
+    return BakeTris(job[2], job[0], job[1], bakeCasters, bakeLights)
 
 
 
@@ -3067,14 +5655,54 @@ def MyPixelDraw(x, y):
 for tri in z3dpy.Render():
     z3dpy.TriToPixels(tri, MyPixelDraw)
 
+
+# With gouraud=True the colour is given too. If the tri has a colour for each
+# point, like from BakeLighting(perVertex=True), it's blended across the tri
+def MyGouraudDraw(x, y, colour):
+    # Draw code here
+    pass
+
+for tri in z3dpy.Render():
+    z3dpy.TriToPixels(tri, MyGouraudDraw, gouraud=True)
+
 '''
 
 def TemplatePixelDraw(x, y):
     return
 
-def TriToPixels(tri, draw=TemplatePixelDraw):
+# Gouraud
+#
+# The numbers TriGouraudAt() needs to blend the colours of the tri's points
+# at a pixel. Tris with one colour give it everywhere.
+def TriGouraudSetup(tri):
+    x0 = tri[0][0]
+    y0 = tri[0][1]
+    ax = tri[1][0] - x0
+    ay = tri[1][1] - y0
+    bx = tri[2][0] - x0
+    by = tri[2][1] - y0
+    c = tri[4] if TriHasPointColours(tri) else (tri[4], tri[4], tri[4])
+    det = ax * by - bx * ay
+    if not det:
+        return (x0, y0, 0.0, 0.0, 0.0, 0.0, c[0], (0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+    return (x0, y0, by / det, -bx / det, -ay / det, ax / det, c[0], VectorSub(c[1], c[0]), VectorSub(c[2], c[0]))
+
+def TriGouraudAt(g, x, y):
+    dx = x - g[0]
+    dy = y - g[1]
+    # Pixels on the edge can be a bit outside
+    b1 = min(max(dx * g[2] + dy * g[3], 0.0), 1.0)
+    b2 = min(max(dx * g[4] + dy * g[5], 0.0), 1.0)
+    if b1 + b2 > 1.0:
+        total = b1 + b2
+        b1 /= total
+        b2 /= total
+    return (g[6][0] + g[7][0] * b1 + g[8][0] * b2, g[6][1] + g[7][1] * b1 + g[8][1] * b2, g[6][2] + g[7][2] * b1 + g[8][2] * b2)
+
+def TriToPixels(tri, draw=TemplatePixelDraw, gouraud=False):
     list = [VectorFloor(tri[0]), VectorFloor(tri[1]), VectorFloor(tri[2])]
     list.sort(key=FillSort)
+    gouraud = TriGouraudSetup(tri) if gouraud else None
 
     diffX = list[2][0] - list[0][0]
 
@@ -3096,11 +5724,14 @@ def TriToPixels(tri, draw=TemplatePixelDraw):
                 ranges.sort()
 
                 for y in range(ranges[0], ranges[1] + 1):
-                    draw(fX, y)
+                    if gouraud:
+                        draw(fX, y, TriGouraudAt(gouraud, fX, y))
+                    else:
+                        draw(fX, y)
 
-        TriToPixelsPt2(list, slope, diff, draw)
+        TriToPixelsPt2(list, slope, diff, draw, gouraud)
 
-def TriToPixelsPt2(list, fSlope, diff, draw):
+def TriToPixelsPt2(list, fSlope, diff, draw, gouraud=None):
     if list[2][0] != list[1][0]:
         diff2 = list[2][0] - list[1][0]
         slope2 = (list[2][1] - list[1][1]) / diff2
@@ -3114,7 +5745,105 @@ def TriToPixelsPt2(list, fSlope, diff, draw):
             ranges.sort()
             fX = floor(x + list[1][0])
             for y in range(ranges[0], ranges[1] + 1):
-                draw(fX, y)
+                if gouraud:
+                    draw(fX, y, TriGouraudAt(gouraud, fX, y))
+                else:
+                    draw(fX, y)
+
+# TriToSpans()
+# Same pixels as TriToPixels(), but returned as a list of columns instead of
+# calling a draw function. Each span is (x, yStart, yEnd), yEnd not included,
+# so it can be used as a slice.
+
+# Usage:
+'''
+for tri in z3dpy.Render():
+    for x, yStart, yEnd in z3dpy.TriToSpans(tri):
+        myColumns[x][yStart:yEnd] = [z3dpy.TriGetColour(tri)] * (yEnd - yStart)
+'''
+
+def TriToSpans(tri):
+    list = [VectorFloor(tri[0]), VectorFloor(tri[1]), VectorFloor(tri[2])]
+    list.sort(key=FillSort)
+    output = []
+    diffX = list[2][0] - list[0][0]
+    if diffX:
+        slope = (list[2][1] - list[0][1]) / diffX
+        diff = list[1][0] - list[0][0]
+        if diff:
+            diff3 = (list[1][1] - list[0][1]) / diff
+            for x in range(floor(diff) + 1):
+                ranges = sorted([floor(diff3 * x + list[0][1]), floor(slope * x + list[0][1])])
+                output.append((floor(x + list[0][0]), ranges[0], ranges[1] + 1))
+
+        if list[2][0] != list[1][0]:
+            diff2 = list[2][0] - list[1][0]
+            slope2 = (list[2][1] - list[1][1]) / diff2
+            for x in range(floor(diff2)):
+                ranges = [floor(slope2 * x + list[1][1]), floor(slope * (x + diff) + list[0][1])]
+                if ranges[0] != ranges[1]:
+                    ranges.sort()
+                    output.append((floor(x + list[1][0]), ranges[0], ranges[1] + 1))
+    return output
+
+# TrisToSpans()
+# TriToSpans() for a whole list of tris at once, done with NumPy.
+# Returns an array of (tri index, x, yStart, yEnd) rows, the index being
+# the tri's place in the list.
+
+# Usage:
+'''
+tris = list(z3dpy.Render())
+spans = z3dpy.TrisToSpans(tris)
+
+# SpansToPixels() turns them into every pixel, to fill a NumPy image at once
+index, x, y = z3dpy.SpansToPixels(spans)
+colours = numpy.array([z3dpy.TriGetColour(tri) for tri in tris])
+myImage[y, x] = colours[index]
+'''
+
+def TrisToSpans(tris):
+    if np is None:
+        return [(i,) + span for i, tri in enumerate(tris) for span in TriToSpans(tri)]
+    tris = tris if type(tris) is list else list(tris)
+    if not tris:
+        return np.zeros((0, 4), dtype=np.int64)
+    points = np.floor(np.array([[t[0][0], t[0][1], t[1][0], t[1][1], t[2][0], t[2][1]] for t in tris], dtype=np.float64)).reshape(-1, 3, 2)
+    points = np.take_along_axis(points, np.argsort(points[:, :, 0], axis=1, kind='stable')[:, :, None], axis=1)
+    x1, y1 = points[:, 0, 0], points[:, 0, 1]
+    x2, y2 = points[:, 1, 0], points[:, 1, 1]
+    x3, y3 = points[:, 2, 0], points[:, 2, 1]
+    diffX = x3 - x1
+    diff = x2 - x1
+    diff2 = x3 - x2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (y3 - y1) / diffX
+        diff3 = (y2 - y1) / diff
+        slope2 = (y3 - y2) / diff2
+    # From P1 to P2, then P2 to P3
+    first = np.where((diffX != 0) & (diff != 0), diff + 1, 0).astype(np.int64)
+    second = np.where(diffX != 0, diff2, 0).astype(np.int64)
+    tri = np.repeat(np.arange(len(tris)), first)
+    x = np.arange(len(tri)) - np.repeat(np.cumsum(first) - first, first)
+    a = np.floor(diff3[tri] * x + y1[tri])
+    b = np.floor(slope[tri] * x + y1[tri])
+    spans1 = np.stack((tri, x + x1[tri], np.minimum(a, b), np.maximum(a, b) + 1), axis=1)
+    tri = np.repeat(np.arange(len(tris)), second)
+    x = np.arange(len(tri)) - np.repeat(np.cumsum(second) - second, second)
+    a = np.floor(slope2[tri] * x + y2[tri])
+    b = np.floor(slope[tri] * (x + diff[tri]) + y1[tri])
+    spans2 = np.stack((tri, x + x2[tri], np.minimum(a, b), np.maximum(a, b) + 1), axis=1)[a != b]
+    spans = np.concatenate((spans1, spans2))
+    # Keeping the same order as drawing them one by one
+    return spans[np.argsort(spans[:, 0], kind='stable')].astype(np.int64)
+
+# Every pixel of the spans, as arrays of tri index, x and y.
+def SpansToPixels(spans):
+    spans = np.asarray(spans, dtype=np.int64).reshape(-1, 4)
+    lengths = spans[:, 3] - spans[:, 2]
+    row = np.repeat(np.arange(len(spans)), lengths)
+    y = np.arange(len(row)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + spans[row, 2]
+    return spans[row, 0], spans[row, 1], y
 
 # TriToTexels()
 # Converts a triangle into pixels with UV coordinates, and calls a given draw function as they are calculated.
@@ -3132,14 +5861,23 @@ def MyTexelDraw(x, y, u, v):
 for tri in Render():
     TriToTexels(tri, myTexelDraw)
 
+# With gouraud=True the colour is given too, blended if the tri has a
+# colour for each point
+def MyGouraudTexelDraw(x, y, u, v, colour):
+    pass
+
+for tri in Render():
+    TriToTexels(tri, MyGouraudTexelDraw, gouraud=True)
+
 '''
 
 def TemplateTexelDraw(x, y, u, v):
     return
 
-def TriToTexels(tri, draw=TemplateTexelDraw):
+def TriToTexels(tri, draw=TemplateTexelDraw, gouraud=False):
     list = [VectorFloor(tri[0]) + tri[0][3:], VectorFloor(tri[1]) + tri[1][3:], VectorFloor(tri[2]) + tri[2][3:]]
     list.sort(key=FillSort)
+    gouraud = TriGouraudSetup(tri) if gouraud else None
 
     diffX = list[2][0] - list[0][0]
 
@@ -3173,11 +5911,14 @@ def TriToTexels(tri, draw=TemplateTexelDraw):
                         for y in range(max(ranges[0], 0), ranges[1] + sgn, sgn):
                             if y < screenSize[1]:
                                 fUVs = UVCalcPt2((y - ranges[0]) / rangD, UVs[0], UVs[1], UVs[2], UVs[3])
-                                draw(fX, y, fUVs[0], fUVs[1])
+                                if gouraud:
+                                    draw(fX, y, fUVs[0], fUVs[1], TriGouraudAt(gouraud, fX, y))
+                                else:
+                                    draw(fX, y, fUVs[0], fUVs[1])
                             
-        TriToTexelsPt2(list, slope, diff, diffX, draw)
+        TriToTexelsPt2(list, slope, diff, diffX, draw, gouraud)
 
-def TriToTexelsPt2(list, fSlope, diff, diffX, draw):
+def TriToTexelsPt2(list, fSlope, diff, diffX, draw, gouraud=None):
     # Repeat the same steps except for this side now.
     if list[2][0] != list[1][0]:
         diff2 = list[2][0] - list[1][0]
@@ -3203,7 +5944,10 @@ def TriToTexelsPt2(list, fSlope, diff, diffX, draw):
 
                         for y in range(max(ranges[0], 0), min(ranges[1] + sgn, screenSize[1]), sgn):
                             fUVs = UVCalcPt2((y - ranges[0]) / rangd, UVs[0], UVs[1], UVs[2], UVs[3])  
-                            draw(fX, y, fUVs[0], fUVs[1])
+                            if gouraud:
+                                draw(fX, y, fUVs[0], fUVs[1], TriGouraudAt(gouraud, fX, y))
+                            else:
+                                draw(fX, y, fUVs[0], fUVs[1])
 
 # UVCalcPt1()
 # Fx is normalized X from either P1 - P2 or P2 - P3 depending on stage
@@ -3231,6 +5975,282 @@ def UVCalcPt1(uv1, uv2, uv3, Fx, Fx2, bStage1):
 def UVCalcPt2(Fy, uvDx, uvDy, UVstX, UVstY):
     return (Fy * uvDx + UVstX, Fy * uvDy + UVstY)
 
+# FrameBuffer:
+#
+# A colour buffer and a depth buffer as NumPy arrays, so tris can be drawn
+# without a draw function for every pixel. Each pixel keeps whatever is
+# closest, so the tris don't need sorting, and tris that go through each
+# other are drawn properly.
+#
+# Modes:
+# RASTER_FLAT uses the tri's colour.
+# RASTER_GOURAUD blends between the colours of each point, if the tri's
+# colour is three colours instead of one.
+# RASTER_TEXTURED looks up the texture with the UVs, skipping pixels
+# that are transparent. Without a texture it's drawn like RASTER_FLAT.
+#
+# Colour is indexed [y][x], with rows going down the screen.
+
+RASTER_FLAT = 0
+RASTER_GOURAUD = 1
+RASTER_TEXTURED = 2
+
+class FrameBuffer():
+    def __init__(self, width=0, height=0, shared=False):
+        if np is None:
+            raise ImportError("FrameBuffer needs NumPy")
+        self.width = width or screenSize[0]
+        self.height = height or screenSize[1]
+        self.memory = None
+        if shared:
+            # Shared memory, so TileRasterizer's processes can draw straight into it
+            self.memory = (SharedMemory(create=True, size=self.width * self.height * 3), SharedMemory(create=True, size=self.width * self.height * 8))
+            self.colour = np.ndarray((self.height, self.width, 3), dtype=np.uint8, buffer=self.memory[0].buf)
+            self.depth = np.ndarray((self.height, self.width), dtype=np.float64, buffer=self.memory[1].buf)
+            self.Clear()
+        else:
+            self.colour = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            self.depth = np.full((self.height, self.width), np.inf)
+
+    # Frees the shared memory, the buffer can't be used after.
+    def Close(self):
+        if self.memory is not None:
+            self.colour = None
+            self.depth = None
+            for m in self.memory:
+                m.close()
+                m.unlink()
+            self.memory = None
+
+    def __repr__(self):
+        return "Z3dPy FrameBuffer:\n\tWidth: " + str(self.width) + "\n\tHeight: " + str(self.height) + "\n\t"
+
+    def Clear(self, colour=(0, 0, 0)):
+        self.colour[:] = colour
+        self.depth[:] = np.inf
+
+    def DrawTris(self, tris, mode=RASTER_FLAT, texture=None):
+        if texture is not None:
+            texture = np.asarray(texture)
+        for tri in tris:
+            self.DrawTri(tri, mode, texture)
+
+    # Tile is (left, top, right, bottom) in pixels, to only draw part of the tri
+    def DrawTri(self, tri, mode=RASTER_FLAT, texture=None, tile=None):
+        x1, y1, z1 = tri[0][0], tri[0][1], tri[0][2]
+        x2, y2, z2 = tri[1][0], tri[1][1], tri[1][2]
+        x3, y3, z3 = tri[2][0], tri[2][1], tri[2][2]
+        area = (x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)
+        if not area:
+            return
+        if tile is None:
+            tile = (0, 0, self.width - 1, self.height - 1)
+        minX = max(floor(min(x1, x2, x3)), tile[0])
+        maxX = min(ceil(max(x1, x2, x3)), tile[2])
+        minY = max(floor(min(y1, y2, y3)), tile[1])
+        maxY = min(ceil(max(y1, y2, y3)), tile[3])
+        if minX > maxX or minY > maxY:
+            return
+        # Edge functions, sampled at the middle of each pixel
+        xs = np.arange(minX, maxX + 1) + 0.5
+        ys = np.arange(minY, maxY + 1)[:, None] + 0.5
+        w1 = ((x3 - x2) * (ys - y2) - (y3 - y2) * (xs - x2)) / area
+        w2 = ((x1 - x3) * (ys - y3) - (y1 - y3) * (xs - x3)) / area
+        w3 = 1.0 - w1 - w2
+        # Blending 1 / z keeps it correct with perspective
+        w1 = w1 / z1
+        w2 = w2 / z2
+        w3 = w3 / z3
+        iz = w1 + w2 + w3
+        mask = (w1 >= 0) & (w2 >= 0) & (w3 >= 0)
+        depth = self.depth[minY:maxY + 1, minX:maxX + 1]
+        with np.errstate(divide='ignore'):
+            z = 1.0 / iz
+        mask &= z < depth
+        if not mask.any():
+            return
+        if mode == RASTER_TEXTURED and texture is None:
+            mode = RASTER_FLAT
+        match mode:
+            case 1:
+                if TriHasPointColours(tri):
+                    c = np.asarray(tri[4], dtype=np.float64)
+                    w1 = w1[mask] / iz[mask]
+                    w2 = w2[mask] / iz[mask]
+                    w3 = w3[mask] / iz[mask]
+                    colour = w1[:, None] * c[0] + w2[:, None] * c[1] + w3[:, None] * c[2]
+                else:
+                    colour = tri[4]
+            case 2:
+                w1 = w1[mask] / iz[mask]
+                w2 = w2[mask] / iz[mask]
+                w3 = w3[mask] / iz[mask]
+                u = w1 * tri[0][4][0] + w2 * tri[1][4][0] + w3 * tri[2][4][0]
+                v = w1 * tri[0][4][1] + w2 * tri[1][4][1] + w3 * tri[2][4][1]
+                # Using abs() to mirror in the negatives, like TriToTexels()
+                sizeU = texture.shape[0]
+                sizeV = texture.shape[1]
+                texels = texture[(np.abs(u) * sizeU).astype(np.int64) % sizeU, (np.abs(v) * sizeV).astype(np.int64) % sizeV]
+                if texels.shape[-1] > 3:
+                    solid = texels[:, 3] > 0
+                    mask[mask] = solid
+                    texels = texels[solid]
+                colour = texels[:, :3]
+            case _:
+                if TriHasPointColours(tri):
+                    colour = VectorDivF(VectorAdd(VectorAdd(tri[4][0], tri[4][1]), tri[4][2]), 3)
+                else:
+                    colour = tri[4]
+        self.colour[minY:maxY + 1, minX:maxX + 1][mask] = np.clip(colour, 0, 255)
+        depth[mask] = z[mask]
+
+# Usage:
+'''
+myBuffer = z3dpy.FrameBuffer()
+
+while True:
+    myBuffer.Clear()
+
+    # No need to sort when drawing to a buffer
+    myBuffer.DrawTris(z3dpy.Render(None))
+
+    # Pygame wants it [x][y]
+    pygame.surfarray.blit_array(screen, myBuffer.colour.swapaxes(0, 1))
+'''
+
+# TileRasterizer:
+#
+# Draws into a shared FrameBuffer with a pool of processes. The screen is
+# split into tiles, each tri is sent to the tiles it covers, and each
+# process draws whole tiles straight into the shared memory, so only the
+# tris are sent to them, never the pixels.
+#
+# Processes is the number of processes, None uses every core.
+#
+# The texture is copied into shared memory too, each time one is given to
+# DrawTris(), so the processes always draw with the latest one.
+
+def TileRasterizerSetup(names, width, height):
+    global tileBuffer
+    global tileTexture
+    tileBuffer = FrameBuffer.__new__(FrameBuffer)
+    tileBuffer.width = width
+    tileBuffer.height = height
+    tileBuffer.memory = (SharedMemory(names[0]), SharedMemory(names[1]))
+    tileBuffer.colour = np.ndarray((height, width, 3), dtype=np.uint8, buffer=tileBuffer.memory[0].buf)
+    tileBuffer.depth = np.ndarray((height, width), dtype=np.float64, buffer=tileBuffer.memory[1].buf)
+    # [0] is the name, [1] is the shared memory, [2] is the array
+    tileTexture = (None, None, None)
+    # Closes the handles when the pool shuts down
+    Finalize(tileBuffer, TileRasterizerFinish, exitpriority=10)
+
+def TileRasterizerFinish():
+    TileRasterizerTexture(None)
+    tileBuffer.colour = None
+    tileBuffer.depth = None
+    for m in tileBuffer.memory:
+        m.close()
+    tileBuffer.memory = None
+
+# Attaches to the texture the job was sent with, share is
+# (name, shape, dtype) or None
+def TileRasterizerTexture(share):
+    global tileTexture
+    name = None if share is None else share[0]
+    if tileTexture[0] != name:
+        memory = tileTexture[1]
+        # The array has to go before the memory can be closed
+        tileTexture = (None, None, None)
+        if memory is not None:
+            memory.close()
+        if share is not None:
+            memory = SharedMemory(name)
+            tileTexture = (name, memory, np.ndarray(share[1], dtype=share[2], buffer=memory.buf))
+    return tileTexture[2]
+
+def TileRasterizerDraw(job):
+    tile, tris, mode, share = job
+    texture = TileRasterizerTexture(share)
+    for tri in tris:
+        tileBuffer.DrawTri(tri, mode, texture, tile)
+
+class TileRasterizer():
+    def __init__(self, frameBuffer, processes=None, tileSize=64, texture=None):
+        if frameBuffer.memory is None:
+            raise ValueError("TileRasterizer needs a FrameBuffer made with shared=True")
+        self.frameBuffer = frameBuffer
+        self.tileSize = tileSize
+        self.processes = processes or cpu_count()
+        # [0] is the shared memory, [1] is the shape, [2] is the dtype
+        self.texture = None
+        self.pool = Pool(self.processes, TileRasterizerSetup, ((frameBuffer.memory[0].name, frameBuffer.memory[1].name), frameBuffer.width, frameBuffer.height))
+        if texture is not None:
+            self.SetTexture(texture)
+
+    # Copies the texture into shared memory, reusing it if it's the same size
+    def SetTexture(self, texture):
+        texture = np.ascontiguousarray(texture)
+        if self.texture is None or self.texture[1] != texture.shape or self.texture[2] != texture.dtype.str:
+            self.FreeTexture()
+            self.texture = (SharedMemory(create=True, size=max(texture.nbytes, 1)), texture.shape, texture.dtype.str)
+        np.ndarray(texture.shape, dtype=texture.dtype, buffer=self.texture[0].buf)[:] = texture
+
+    def FreeTexture(self):
+        if self.texture is not None:
+            self.texture[0].close()
+            self.texture[0].unlink()
+            self.texture = None
+
+    def DrawTris(self, tris, mode=RASTER_FLAT, texture=None):
+        if texture is not None:
+            self.SetTexture(texture)
+        share = None if self.texture is None else (self.texture[0].name, self.texture[1], self.texture[2])
+        size = self.tileSize
+        across = (self.frameBuffer.width + size - 1) // size
+        down = (self.frameBuffer.height + size - 1) // size
+        tiles = [[] for t in range(across * down)]
+        for tri in tris:
+            # Only what DrawTri() needs is sent
+            small = [[tri[0][0], tri[0][1], tri[0][2], 0, tri[0][4]], [tri[1][0], tri[1][1], tri[1][2], 0, tri[1][4]], [tri[2][0], tri[2][1], tri[2][2], 0, tri[2][4]], 0, tri[4]]
+            left = max(floor(min(tri[0][0], tri[1][0], tri[2][0])) // size, 0)
+            right = min(ceil(max(tri[0][0], tri[1][0], tri[2][0])) // size, across - 1)
+            top = max(floor(min(tri[0][1], tri[1][1], tri[2][1])) // size, 0)
+            bottom = min(ceil(max(tri[0][1], tri[1][1], tri[2][1])) // size, down - 1)
+            for y in range(top, bottom + 1):
+                for x in range(left, right + 1):
+                    tiles[y * across + x].append(small)
+        jobs = []
+        for t in range(len(tiles)):
+            if tiles[t]:
+                x = (t % across) * size
+                y = (t // across) * size
+                jobs.append(((x, y, min(x + size, self.frameBuffer.width) - 1, min(y + size, self.frameBuffer.height) - 1), tiles[t], mode, share))
+        # Waits till every tile is done
+        self.pool.map(TileRasterizerDraw, jobs, max(len(jobs) // (self.processes * 4), 1))
+
+    def Close(self):
+        self.pool.close()
+        self.pool.join()
+        self.FreeTexture()
+
+# Usage:
+'''
+if __name__ == "__main__":
+    myBuffer = z3dpy.FrameBuffer(1920, 1080, shared=True)
+    myRasterizer = z3dpy.TileRasterizer(myBuffer)
+
+    myBuffer.Clear()
+    myRasterizer.DrawTris(z3dpy.Render(None))
+
+    # Textured, the texture can change between frames
+    myRasterizer.DrawTris(z3dpy.Render(None), z3dpy.RASTER_TEXTURED, myTexture)
+
+    # myBuffer.colour has the finished frame
+
+    myRasterizer.Close()
+    myBuffer.Close()
+'''
+
 
 #==========================================================================
 #  